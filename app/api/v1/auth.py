@@ -2,25 +2,41 @@
 Authentication API endpoints.
 """
 
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...database.connection import get_db
 from app.core.auth import (
     verify_password, create_access_token, create_token_pair,
-    get_current_active_user, store_refresh_token, revoke_refresh_token,
+    store_refresh_token, revoke_refresh_token,
     get_refresh_token, revoke_user_refresh_tokens,
-    get_user_by_username, get_user_by_id, create_user, authenticate_user
+    get_user_by_username, get_user_by_id, create_user_if_absent,
+    authenticate_user
 )
 from ...core.config import settings
-from ...core.deps import get_current_active_user, get_current_admin_user
+from ...core.deps import CurrentUser, get_current_active_user, get_current_admin_user, invalidate_cached_user
 from ...schemas.auth import LoginRequest, Token, UserCreate, UserSignup, UserResponse, RefreshTokenRequest, LogoutRequest, GrantAdminRequest
 from ...models.database import User
 
 
 router = APIRouter()
 
+_ACCESS_TOKEN_EXPIRES_SECONDS = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+
+def _user_response(user: User) -> UserResponse:
+    """Build UserResponse from a trusted DB row without re-running validation."""
+    return UserResponse.model_construct(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        is_active=user.is_active,
+        is_admin=user.is_admin,
+        created_at=user.created_at,
+        updated_at=user.updated_at
+    )
+
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup_user(
@@ -36,22 +52,20 @@ async def signup_user(
     
     Note: All new users are created as regular users (not admins).
     """
-    # Check if user already exists
-    existing_user = await get_user_by_username(db, user_data.username)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
-    
-    # Create new user (always as regular user)
-    user = await create_user(
+    # Create new user (always as regular user); the insert is skipped
+    # atomically if the username or email is already taken
+    user = await create_user_if_absent(
         db=db,
         username=user_data.username,
         email=user_data.email,
         password=user_data.password,
         is_admin=False  # Public signup always creates regular users
     )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered"
+        )
     
     return user
 
@@ -79,20 +93,21 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create token pair
+    # Create token pair; the refresh token is stored before responding so an
+    # immediate /refresh always finds it
     access_token, refresh_token = await create_token_pair(db, user)
     
     return Token(
         access_token=access_token,
         refresh_token=refresh_token,
-        expires_in=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60,  # in seconds
-        user=UserResponse.model_validate(user)
+        expires_in=_ACCESS_TOKEN_EXPIRES_SECONDS,
+        user=_user_response(user)
     )
 
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user)
 ):
     """
     Get current user information.
@@ -106,7 +121,7 @@ async def get_current_user_info(
 async def grant_admin_privileges(
     grant_request: GrantAdminRequest,
     db: AsyncSession = Depends(get_db),
-    current_admin: User = Depends(get_current_admin_user)
+    current_admin: CurrentUser = Depends(get_current_admin_user)
 ):
     """
     Grant admin privileges to a user (admin only).
@@ -129,10 +144,12 @@ async def grant_admin_privileges(
             detail="User already has admin privileges"
         )
     
-    # Grant admin privileges
+    # Grant admin privileges. updated_at is set explicitly so the column's
+    # onupdate does not expire it and no refresh SELECT is needed.
     user.is_admin = True
+    user.updated_at = datetime.now(timezone.utc)
     await db.commit()
-    await db.refresh(user)
+    invalidate_cached_user(user.id)
     
     return user
 
@@ -172,8 +189,8 @@ async def refresh_token(
     return Token(
         access_token=access_token,
         refresh_token=new_refresh_token,
-        expires_in=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user=UserResponse.model_validate(user)
+        expires_in=_ACCESS_TOKEN_EXPIRES_SECONDS,
+        user=_user_response(user)
     )
 
 
@@ -197,7 +214,7 @@ async def logout(
 
 @router.post("/logout-all", status_code=status.HTTP_200_OK)
 async def logout_all(
-    current_user: User = Depends(get_current_active_user),
+    current_user: CurrentUser = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -206,6 +223,7 @@ async def logout_all(
     Requires valid JWT token in Authorization header.
     """
     count = await revoke_user_refresh_tokens(db, current_user.id)
+    invalidate_cached_user(current_user.id)
     
     return {
         "message": f"Successfully logged out from {count} device(s)",
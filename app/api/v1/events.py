@@ -2,37 +2,71 @@
 Events API endpoints for event ingestion.
 """
 
-from typing import List, Optional
+import base64
+import binascii
+import logging
+from typing import List, Optional, Tuple
 from datetime import datetime
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+import msgspec
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import ORJSONResponse
 
 from ...core.logging import get_logger
-from ...database.connection import get_db
 from ...models.schemas import (
-    EventsRequest, EventsResponse, ErrorResponse
+    EventInput, EventsRequestStruct, EventsResponse, ErrorResponse
 )
 from ...services.event_service import EventService
-from ...core.deps import get_current_active_user
-from ...models.database import User
+from ...core.deps import CurrentUser, get_current_active_user, get_event_service
 
 logger = get_logger(__name__)
 
 router = APIRouter(tags=["events"])
 
+_events_request_decoder = msgspec.json.Decoder(EventsRequestStruct)
+
+
+def _encode_cursor(occurred_at: datetime, event_id: UUID) -> str:
+    """Encode a keyset pagination cursor from the last event of a page."""
+    raw = f"{occurred_at.isoformat()}|{event_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a keyset pagination cursor into (occurred_at, event_id)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        occurred_at, event_id = raw.split("|", 1)
+        return datetime.fromisoformat(occurred_at), UUID(event_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
 
 @router.post(
     "/events",
     response_model=EventsResponse,
     status_code=status.HTTP_201_CREATED,
     summary="Ingest events",
-    description="Accept batch of events for ingestion with idempotency support"
+    description="Accept batch of events for ingestion with idempotency support",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "example": {"events": [EventInput.model_config["json_schema_extra"]["example"]]}
+                }
+            },
+        }
+    }
 )
 async def ingest_events(
-    events_request: EventsRequest,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    event_service: EventService = Depends(get_event_service),
+    current_user: CurrentUser = Depends(get_current_active_user)
 ) -> EventsResponse:
     """
     Ingest a batch of events.
@@ -41,28 +75,28 @@ async def ingest_events(
     - Supports idempotency - duplicate event_ids are safely ignored
     - Returns summary of processed events
     """
+    # The body is decoded and validated by msgspec straight from bytes,
+    # bypassing FastAPI's json.loads + per-event Pydantic validation.
     try:
-        event_service = EventService(db)
-        
-        logger.info(
-            "Processing events batch",
-            events_count=len(events_request.events)
+        events_request = _events_request_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
         )
-        
-        # Debug: log first event details
-        if events_request.events:
+    
+    try:
+        if logger.isEnabledFor(logging.DEBUG):
             first_event = events_request.events[0]
-            logger.info(
-                "First event details",
-                event_id=str(first_event.event_id),
-                user_id=first_event.user_id,
-                event_type=first_event.event_type,
-                properties_type=type(first_event.properties).__name__
+            logger.debug(
+                "Processing events batch",
+                events_count=len(events_request.events),
+                first_event_id=str(first_event.event_id),
+                first_event_type=first_event.event_type
             )
         
-        responses, created_count, duplicate_count = await event_service.create_events(
-            events_request.events
-        )
+        rows = [msgspec.structs.asdict(event) for event in events_request.events]
+        responses, created_count, duplicate_count = await event_service.insert_rows(rows)
         
         return EventsResponse(
             processed=len(responses),
@@ -72,14 +106,9 @@ async def ingest_events(
         )
         
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        
-        logger.error(
+        logger.exception(
             "Failed to process events batch",
-            error=str(e),
-            events_count=len(events_request.events),
-            traceback=error_trace
+            events_count=len(events_request.events)
         )
         
         # Повертаємо детальну інформацію про помилку для діагностики
@@ -91,6 +120,7 @@ async def ingest_events(
 
 @router.get(
     "/events",
+    response_class=ORJSONResponse,
     summary="Get events",
     description="Retrieve events with optional filtering and pagination"
 )
@@ -100,8 +130,8 @@ async def get_events(
     from_date: Optional[datetime] = Query(None, description="Filter events from this date"),
     to_date: Optional[datetime] = Query(None, description="Filter events to this date"),
     limit: int = Query(100, ge=1, le=1000, description="Number of events to return"),
-    offset: int = Query(0, ge=0, description="Number of events to skip"),
-    db: AsyncSession = Depends(get_db)
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    event_service: EventService = Depends(get_event_service)
 ):
     """
     Get events with optional filtering and pagination.
@@ -111,11 +141,11 @@ async def get_events(
     - **from_date**: Start date for filtering (ISO-8601)
     - **to_date**: End date for filtering (ISO-8601)
     - **limit**: Maximum number of events to return (1-1000)
-    - **offset**: Number of events to skip for pagination
+    - **after**: Opaque cursor (`next_cursor` of the previous page) for keyset pagination
     """
+    before = _decode_cursor(after) if after else None
+    
     try:
-        event_service = EventService(db)
-        
         logger.info(
             "Retrieving events",
             user_id=user_id,
@@ -123,7 +153,7 @@ async def get_events(
             from_date=from_date.isoformat() if from_date else None,
             to_date=to_date.isoformat() if to_date else None,
             limit=limit,
-            offset=offset
+            after=after
         )
         
         events = await event_service.get_events(
@@ -132,39 +162,33 @@ async def get_events(
             from_date=from_date,
             to_date=to_date,
             limit=limit,
-            offset=offset
+            before=before
         )
         
-        # Convert to response format
-        events_data = []
-        for event in events:
-            # Safely parse properties JSON
-            properties = {}
-            if event.properties:
-                try:
-                    if isinstance(event.properties, str):
-                        import json
-                        properties = json.loads(event.properties)
-                    elif isinstance(event.properties, dict):
-                        properties = event.properties
-                except (json.JSONDecodeError, ValueError):
-                    properties = {}
-            
-            events_data.append({
-                "event_id": str(event.event_id),
-                "occurred_at": event.occurred_at.isoformat(),
+        # orjson serializes UUID/datetime natively, no per-row isoformat()/str()
+        events_data = [
+            {
+                "event_id": event.event_id,
+                "occurred_at": event.occurred_at,
                 "user_id": event.user_id,
                 "event_type": event.event_type,
-                "properties": properties,
-                "created_at": event.created_at.isoformat()
-            })
+                "properties": event.properties or {},
+                "created_at": event.created_at
+            }
+            for event in events
+        ]
+        
+        next_cursor = None
+        if len(events) == limit:
+            last_event = events[-1]
+            next_cursor = _encode_cursor(last_event.occurred_at, last_event.event_id)
         
-        return {
+        return ORJSONResponse(content={
             "events": events_data,
             "count": len(events_data),
             "limit": limit,
-            "offset": offset
-        }
+            "next_cursor": next_cursor
+        })
         
     except Exception as e:
         logger.error(
@@ -2,14 +2,15 @@
 Statistics API endpoints for analytics.
 """
 
+from datetime import date, datetime, time
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...core.logging import get_logger
-from ...database.connection import get_db
 from ...services.analytics_service import AnalyticsService
-from ...core.deps import get_current_admin_user
-from ...models.database import User
+from ...services.stats_cache import BASIC_STATS_TTL, cache_key, stats_cache, window_ttl
+from ...core.deps import CurrentUser, get_current_admin_user, get_analytics_service
 
 logger = get_logger(__name__)
 
@@ -22,8 +23,8 @@ router = APIRouter(tags=["statistics"])
     description="Get basic event statistics (Admin only)"
 )
 async def get_basic_stats(
-    db: AsyncSession = Depends(get_db),
-    current_admin: User = Depends(get_current_admin_user)
+    analytics_service: AnalyticsService = Depends(get_analytics_service),
+    current_admin: CurrentUser = Depends(get_current_admin_user)
 ):
     """
     Get basic event statistics.
@@ -34,8 +35,9 @@ async def get_basic_stats(
     - Event types count
     """
     try:
-        analytics_service = AnalyticsService(db)
-        stats = await analytics_service.get_basic_stats()
+        stats = await stats_cache.get_or_compute(
+            cache_key("basic", {}), BASIC_STATS_TTL, analytics_service.get_basic_stats
+        )
         
         return stats
         
@@ -53,11 +55,13 @@ async def get_basic_stats(
     description="Get top event types by count (Admin only)"
 )
 async def get_top_events(
-    from_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
-    to_date: str = Query(..., description="End date (YYYY-MM-DD)"),
+    from_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
+    to_date: date = Query(..., description="End date (YYYY-MM-DD)"),
     limit: int = Query(10, ge=1, le=100, description="Number of top events to return"),
-    db: AsyncSession = Depends(get_db),
-    current_admin: User = Depends(get_current_admin_user)
+    property_key: Optional[str] = Query(None, description="Only count events having this property key"),
+    property_value: Optional[str] = Query(None, description="Required value of property_key"),
+    analytics_service: AnalyticsService = Depends(get_analytics_service),
+    current_admin: CurrentUser = Depends(get_current_admin_user)
 ):
     """
     Get top event types by occurrence count.
@@ -65,24 +69,42 @@ async def get_top_events(
     - **from_date**: Start date for filtering (YYYY-MM-DD)
     - **to_date**: End date for filtering (YYYY-MM-DD)  
     - **limit**: Number of top events to return (1-100)
+    - **property_key** / **property_value**: Optional property filter, both or neither
     - Returns event types ordered by count (descending)
+    
+    Unfiltered counts come from the daily rollups: the last ROLLUP_REFRESH_DAYS
+    days lag ingestion by up to ROLLUP_REFRESH_INTERVAL seconds, and events
+    backfilled into older days appear only after a full rollup refresh.
     """
     try:
-        from datetime import datetime
-        
-        # Parse dates
-        from_dt = datetime.strptime(from_date, "%Y-%m-%d")
-        to_dt = datetime.strptime(to_date, "%Y-%m-%d")
-        
         # Validate date range
-        if from_dt > to_dt:
+        if from_date > to_date:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="from_date must be less than or equal to to_date"
             )
         
-        analytics_service = AnalyticsService(db)
-        top_events = await analytics_service.get_top_events(from_dt, to_dt, limit)
+        if (property_key is None) != (property_value is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="property_key and property_value must be given together"
+            )
+        properties = {property_key: property_value} if property_key is not None else None
+        
+        top_events = await stats_cache.get_or_compute(
+            cache_key("top-events", {
+                "from_date": from_date,
+                "to_date": to_date,
+                "limit": limit,
+                "property_key": property_key,
+                "property_value": property_value,
+            }),
+            window_ttl(to_date),
+            lambda: analytics_service.get_top_events(
+                datetime.combine(from_date, time.min), datetime.combine(to_date, time.min), limit,
+                properties=properties
+            )
+        )
         
         return {
             "from_date": from_date,
@@ -91,11 +113,6 @@ async def get_top_events(
             "data": top_events
         }
         
-    except ValueError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid date format. Use YYYY-MM-DD"
-        )
     except HTTPException:
         raise
     except Exception as e:
@@ -112,10 +129,10 @@ async def get_top_events(
     description="Get Daily Active Users statistics (Admin only)"
 )
 async def get_dau_stats(
-    from_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
-    to_date: str = Query(..., description="End date (YYYY-MM-DD)"),
-    db: AsyncSession = Depends(get_db),
-    current_admin: User = Depends(get_current_admin_user)
+    from_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
+    to_date: date = Query(..., description="End date (YYYY-MM-DD)"),
+    analytics_service: AnalyticsService = Depends(get_analytics_service),
+    current_admin: CurrentUser = Depends(get_current_admin_user)
 ):
     """
     Get Daily Active Users statistics.
@@ -123,23 +140,26 @@ async def get_dau_stats(
     - **from_date**: Start date for filtering (YYYY-MM-DD)
     - **to_date**: End date for filtering (YYYY-MM-DD)
     - Returns daily unique user counts
+    
+    Counts come from the daily rollups: the last ROLLUP_REFRESH_DAYS days lag
+    ingestion by up to ROLLUP_REFRESH_INTERVAL seconds, and events backfilled
+    into older days appear only after a full rollup refresh.
     """
     try:
-        from datetime import datetime
-        
-        # Parse dates
-        from_dt = datetime.strptime(from_date, "%Y-%m-%d")
-        to_dt = datetime.strptime(to_date, "%Y-%m-%d")
-        
         # Validate date range
-        if from_dt > to_dt:
+        if from_date > to_date:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="from_date must be less than or equal to to_date"
             )
         
-        analytics_service = AnalyticsService(db)
-        dau_stats = await analytics_service.get_dau_stats(from_dt, to_dt)
+        dau_stats = await stats_cache.get_or_compute(
+            cache_key("dau", {"from_date": from_date, "to_date": to_date}),
+            window_ttl(to_date),
+            lambda: analytics_service.get_dau_stats(
+                datetime.combine(from_date, time.min), datetime.combine(to_date, time.min)
+            )
+        )
         
         return {
             "from_date": from_date,
@@ -147,11 +167,6 @@ async def get_dau_stats(
             "data": dau_stats
         }
         
-    except ValueError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid date format. Use YYYY-MM-DD"
-        )
     except HTTPException:
         raise
     except Exception as e:
@@ -168,11 +183,11 @@ async def get_dau_stats(
     description="Get user retention statistics (Admin only)"
 )
 async def get_retention_stats(
-    start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
+    start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
     windows: int = Query(..., ge=1, le=10, description="Number of retention windows"),
     period_type: str = Query(..., description="Period type (daily, weekly, monthly)"),
-    db: AsyncSession = Depends(get_db),
-    current_admin: User = Depends(get_current_admin_user)
+    analytics_service: AnalyticsService = Depends(get_analytics_service),
+    current_admin: CurrentUser = Depends(get_current_admin_user)
 ):
     """
     Get user retention statistics.
@@ -182,13 +197,9 @@ async def get_retention_stats(
     - **period_type**: Type of period (daily, weekly, monthly)
     """
     try:
-        from datetime import datetime
-        
-        # Parse date
-        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-        
-        analytics_service = AnalyticsService(db)
-        retention_stats = await analytics_service.get_retention_stats(start_dt, windows, period_type)
+        retention_stats = await analytics_service.get_retention_stats(
+            datetime.combine(start_date, time.min), windows, period_type
+        )
         
         return {
             "start_date": start_date,
@@ -197,11 +208,6 @@ async def get_retention_stats(
             "data": retention_stats
         }
         
-    except ValueError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid date format. Use YYYY-MM-DD"
-        )
     except HTTPException:
         raise
     except Exception as e:
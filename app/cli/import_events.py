@@ -7,109 +7,320 @@ Usage:
 """
 
 import argparse
+import asyncio
 import csv
-import json
+import io
+import multiprocessing
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterator, List, Tuple
 from uuid import UUID
 
+import orjson
+
+try:
+    import uvloop
+except ImportError:  # uvloop is Linux/macOS only; the stdlib loop works too
+    uvloop = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pyarrow is optional; fall back to the stdlib csv module
+    pa = None
+
+try:
+    from ciso8601 import parse_datetime as _parse_datetime
+except ImportError:  # Python 3.11+ fromisoformat accepts a trailing 'Z' natively
+    _parse_datetime = datetime.fromisoformat
+
 from ..core.config import settings
 from ..core.logging import setup_logging, get_logger
-from ..database.connection import get_database_url, AsyncSessionLocal
+from ..database.connection import AsyncSessionLocal, async_engine
+from ..models.database import Base
 from ..models.schemas import EventInput
+from ..services.analytics_service import AnalyticsService
 from ..services.event_service import EventService
 
 logger = get_logger(__name__)
 
+CSV_COLUMNS = ('event_id', 'occurred_at', 'user_id', 'event_type', 'properties_json')
+
+# pyarrow reads the file in blocks of this size; 8 MiB suits the five
+# narrow columns above
+ARROW_BLOCK_SIZE = 8 << 20
+
+# Read buffer for the stdlib csv fallback (default would be 8 KiB)
+CSV_READ_BUFFER_SIZE = 1 << 20
+
+# Concurrent DB writers and how many parsed batches may wait for them
+IMPORT_WRITERS = 3
+IMPORT_QUEUE_SIZE = 4
+
+
+def _skip_invalid_arrow_row(row) -> str:
+    """pyarrow invalid_row_handler: log and skip rows with the wrong column count."""
+    logger.error(
+        f"Skipping invalid row {row.number}: expected {row.expected_columns} "
+        f"columns, got {row.actual_columns}: {row.text}"
+    )
+    return 'skip'
+
+
+def iter_csv_rows(csv_path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream CSV rows as dicts, using pyarrow's C++ reader when available."""
+    if pa is None:
+        with open(csv_path, 'rb', buffering=CSV_READ_BUFFER_SIZE) as raw:
+            file = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            yield from csv.DictReader(file)
+        return
+    
+    # Columns are kept as strings so that parse_csv_row still validates and
+    # skips malformed rows one by one instead of failing a whole block.
+    # Rows with a wrong column count never reach it; without the handler
+    # they would raise ArrowInvalid and end the import.
+    reader = pacsv.open_csv(
+        str(csv_path),
+        read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(invalid_row_handler=_skip_invalid_arrow_row),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in CSV_COLUMNS},
+            strings_can_be_null=False
+        )
+    )
+    for record_batch in reader:
+        yield from record_batch.to_pylist()
+
+
+def iter_csv_range_rows(csv_path: Path, start: int, end: int, fieldnames: List[str]) -> Iterator[Dict[str, Any]]:
+    """Stream CSV rows whose lines start within [start, end) of the file."""
+    with open(csv_path, 'rb', buffering=CSV_READ_BUFFER_SIZE) as raw:
+        raw.seek(start)
+        
+        def lines() -> Iterator[str]:
+            position = start
+            while position < end:
+                line = raw.readline()
+                if not line:
+                    break
+                position += len(line)
+                yield line.decode('utf-8')
+        
+        yield from csv.DictReader(lines(), fieldnames=fieldnames)
+
+
+def split_byte_ranges(csv_path: Path, parts: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Split the data section of a CSV file into newline-aligned byte ranges.
+    
+    Ranges are cut at line boundaries, so records must not contain raw
+    newlines (properties_json is JSON-encoded and escapes them).
+    
+    Returns:
+        Tuple of (header fieldnames, [(start, end), ...])
+    """
+    size = csv_path.stat().st_size
+    
+    with open(csv_path, 'rb') as file:
+        header = file.readline()
+        data_start = file.tell()
+        step = max((size - data_start) // parts, 1)
+        
+        bounds = [data_start]
+        for i in range(1, parts):
+            file.seek(data_start + i * step)
+            file.readline()  # move to the start of the next line
+            position = file.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+        bounds.append(size)
+    
+    fieldnames = next(csv.reader([header.decode('utf-8')]))
+    return fieldnames, list(zip(bounds, bounds[1:]))
+
 
 def parse_csv_row(row: dict) -> EventInput:
     """Parse CSV row into EventInput model."""
     try:
         # Parse the datetime string
-        occurred_at = datetime.fromisoformat(row['occurred_at'].replace('Z', '+00:00'))
+        occurred_at = _parse_datetime(row['occurred_at'])
         
         # Parse properties JSON
         properties = {}
         if row.get('properties_json'):
-            properties = json.loads(row['properties_json'])
+            properties = orjson.loads(row['properties_json'])
         
-        return EventInput(
+        fields = dict(
             event_id=UUID(row['event_id']),
             occurred_at=occurred_at,
             user_id=str(row['user_id']),  # Convert to string as required by schema
             event_type=row['event_type'],
             properties=properties
         )
-    except (ValueError, KeyError) as e:
+        if settings.DEBUG:
+            return EventInput(**fields)
+        
+        # Fields are already typed above; only the schema's length limits
+        # remain to be checked before skipping Pydantic validation
+        if not fields['user_id'] or not 1 <= len(fields['event_type']) <= 100:
+            raise ValueError("user_id must be non-empty and event_type 1-100 characters")
+        if not isinstance(properties, dict):
+            raise ValueError("properties_json must be a JSON object")
+        return EventInput.model_construct(**fields)
+    # TypeError covers short rows, whose missing fields csv.DictReader fills with None
+    except (ValueError, KeyError, TypeError) as e:
         raise ValueError(f"Failed to parse row {row}: {e}")
 
 
-async def import_events_from_csv(csv_path: Path, batch_size: int = 1000) -> None:
-    """Import events from CSV file."""
+async def import_events_from_csv(csv_path: Path, batch_size: int = 1000, workers: int = 1) -> None:
+    """Import events from CSV file, optionally split across worker processes."""
     
     if not csv_path.exists():
         logger.error(f"CSV file not found: {csv_path}")
         sys.exit(1)
     
-    # Initialize database tables using sync engine
-    from sqlalchemy import create_engine
-    from ..models.database import Base
+    # Initialize database tables through the async engine's pool
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
     
-    sync_engine = create_engine(get_database_url(async_url=False))
-    Base.metadata.create_all(bind=sync_engine)
-    sync_engine.dispose()
+    logger.info(f"Starting import from {csv_path}", workers=workers)
     
-    total_processed = 0
-    total_created = 0
-    total_duplicates = 0
-    
-    logger.info(f"Starting import from {csv_path}")
-    
-    with open(csv_path, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        batch = []
-        
-        for row_num, row in enumerate(reader, start=1):
-            try:
-                event = parse_csv_row(row)
-                batch.append(event)
-                
-                # Process batch when it reaches batch_size
-                if len(batch) >= batch_size:
-                    processed, created, duplicates = await process_batch_async(batch)
-                    total_processed += processed
-                    total_created += created
-                    total_duplicates += duplicates
-                    
-                    logger.info(
-                        f"Processed batch",
-                        batch_size=len(batch),
-                        total_processed=total_processed,
-                        total_created=total_created,
-                        total_duplicates=total_duplicates
-                    )
-                    
-                    batch = []
-                
-            except ValueError as e:
-                logger.error(f"Skipping invalid row {row_num}: {e}")
-                continue
-        
-        # Process remaining events in the final batch
-        if batch:
-            processed, created, duplicates = await process_batch_async(batch)
-            total_processed += processed
-            total_created += created
-            total_duplicates += duplicates
+    if workers > 1:
+        totals = await asyncio.to_thread(_import_in_processes, csv_path, batch_size, workers)
+    else:
+        totals = await _run_pipeline(iter_csv_rows(csv_path), batch_size)
     
     logger.info(
         "Import completed",
-        total_processed=total_processed,
-        total_created=total_created,
-        total_duplicates=total_duplicates
+        total_processed=totals['processed'],
+        total_created=totals['created'],
+        total_duplicates=totals['duplicates']
     )
+    
+    # Imports may backfill any day, so rebuild the DAU/top-events rollups
+    # in full rather than only the recent days the periodic refresh covers.
+    # Waits out a periodic refresh holding the lock instead of skipping.
+    async with AsyncSessionLocal() as db:
+        await AnalyticsService(db).refresh_rollups(days=None, wait=True)
+
+
+def _import_in_processes(csv_path: Path, batch_size: int, workers: int) -> Dict[str, int]:
+    """Import newline-aligned byte ranges of the file in parallel processes."""
+    fieldnames, ranges = split_byte_ranges(csv_path, workers)
+    
+    # spawn: children must not inherit the parent's pooled connections
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(len(ranges)) as pool:
+        results = pool.starmap(
+            _import_byte_range,
+            [(csv_path, start, end, fieldnames, batch_size) for start, end in ranges]
+        )
+    
+    return {
+        'processed': sum(result[0] for result in results),
+        'created': sum(result[1] for result in results),
+        'duplicates': sum(result[2] for result in results),
+    }
+
+
+def _import_byte_range(
+    csv_path: Path,
+    start: int,
+    end: int,
+    fieldnames: List[str],
+    batch_size: int
+) -> Tuple[int, int, int]:
+    """Worker process entry point: import one byte range of the file."""
+    setup_logging()
+    if uvloop is not None:
+        uvloop.install()
+    
+    async def run() -> Dict[str, int]:
+        try:
+            return await _run_pipeline(
+                iter_csv_range_rows(csv_path, start, end, fieldnames), batch_size
+            )
+        finally:
+            await async_engine.dispose()
+    
+    totals = asyncio.run(run())
+    return totals['processed'], totals['created'], totals['duplicates']
+
+
+async def _run_pipeline(rows: Iterator[Dict[str, Any]], batch_size: int) -> Dict[str, int]:
+    """Parse rows and write them to the database; returns the import totals."""
+    # Parsing (producer) and DB writes (consumers) overlap: while one batch
+    # is being committed the next one is already being parsed
+    queue: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_QUEUE_SIZE)
+    totals = {'processed': 0, 'created': 0, 'duplicates': 0}
+    
+    consumers = [
+        asyncio.create_task(_consume_batches(queue, totals))
+        for _ in range(IMPORT_WRITERS)
+    ]
+    try:
+        await _produce_batches(rows, queue, batch_size)
+        await queue.join()
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+    
+    return totals
+
+
+def _parse_next_batch(rows: Iterator[Tuple[int, Dict[str, Any]]], batch_size: int) -> List[EventInput]:
+    """Parse up to batch_size valid rows; an empty result means the file is exhausted."""
+    batch = []
+    
+    for row_num, row in rows:
+        try:
+            batch.append(parse_csv_row(row))
+        except ValueError as e:
+            logger.error(f"Skipping invalid row {row_num}: {e}")
+            continue
+        
+        if len(batch) >= batch_size:
+            break
+    
+    return batch
+
+
+async def _produce_batches(rows: Iterator[Dict[str, Any]], queue: asyncio.Queue, batch_size: int) -> None:
+    """Parse CSV rows in a worker thread and put batches of events on the queue."""
+    numbered_rows = enumerate(rows, start=1)
+    
+    while True:
+        # Reading and parsing are blocking CPython work; keep them off the
+        # event loop so the writers' DB I/O keeps flowing meanwhile
+        batch = await asyncio.to_thread(_parse_next_batch, numbered_rows, batch_size)
+        if not batch:
+            break
+        await queue.put(batch)
+
+
+async def _consume_batches(queue: asyncio.Queue, totals: Dict[str, int]) -> None:
+    """Write batches from the queue to the database and update the totals."""
+    while True:
+        batch = await queue.get()
+        try:
+            processed, created, duplicates = await process_batch_async(batch)
+            totals['processed'] += processed
+            totals['created'] += created
+            totals['duplicates'] += duplicates
+            
+            logger.info(
+                f"Processed batch",
+                batch_size=len(batch),
+                total_processed=totals['processed'],
+                total_created=totals['created'],
+                total_duplicates=totals['duplicates']
+            )
+        finally:
+            queue.task_done()
 
 
 async def process_batch_async(events: List[EventInput]) -> tuple[int, int, int]:
@@ -117,7 +328,9 @@ async def process_batch_async(events: List[EventInput]) -> tuple[int, int, int]:
     try:
         async with AsyncSessionLocal() as db:
             event_service = EventService(db)
-            responses, created_count, duplicate_count = await event_service.create_events(events)
+            responses, created_count, duplicate_count = await event_service.copy_insert(
+                [event.model_dump() for event in events]
+            )
             return len(responses), created_count, duplicate_count
     except Exception as e:
         logger.error(f"Failed to process batch: {e}")
@@ -140,15 +353,23 @@ def main():
         default=1000,
         help="Number of events to process in each batch (default: 1000)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes importing byte ranges of the file in parallel (default: 1)"
+    )
     
     args = parser.parse_args()
     
     # Setup logging
     setup_logging()
     
+    if uvloop is not None:
+        uvloop.install()
+    
     try:
-        import asyncio
-        asyncio.run(import_events_from_csv(args.csv_path, args.batch_size))
+        asyncio.run(import_events_from_csv(args.csv_path, args.batch_size, args.workers))
     except KeyboardInterrupt:
         logger.info("Import interrupted by user")
         sys.exit(1)
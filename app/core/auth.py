@@ -2,29 +2,44 @@
 JWT authentication utilities with refresh token support.
 """
 
+import asyncio
 import hashlib
 import secrets
+import time
 from datetime import datetime, timedelta, UTC
+from functools import lru_cache
 from typing import Optional, Dict, Any, Tuple
 from uuid import uuid4
 
-from jose import JWTError, jwt
+import jwt
+from jwt.exceptions import PyJWTError as JWTError
 from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update
+from sqlalchemy import bindparam, select, delete, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from ..core.config import settings
 from ..models.database import User, RefreshToken
-from ..database.connection import get_db
 
-# OAuth2 scheme for token authentication
-oauth2_scheme = HTTPBearer()
-
-
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# JWT settings bound once; they are read on every authenticated request
+_JWT_SECRET_KEY = settings.JWT_SECRET_KEY
+_JWT_ALGORITHM = settings.JWT_ALGORITHM
+_JWT_ALGORITHMS = [settings.JWT_ALGORITHM]
+_ACCESS_TOKEN_TTL = timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+_REFRESH_TOKEN_TTL = timedelta(days=settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS)
+
+# Password hashing context: new hashes use Argon2id (RFC 9106 / OWASP
+# low-memory profile); existing bcrypt hashes still verify and are
+# upgraded on the next successful login
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__memory_cost=19456,
+    argon2__time_cost=2,
+    argon2__parallelism=1
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -32,6 +47,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if its scheme is deprecated."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """Hash a password for storing in the database."""
     return pwd_context.hash(password)
@@ -41,17 +61,14 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     """Create a JWT access token."""
     to_encode = data.copy()
     
-    if expires_delta:
-        expire = datetime.now(UTC) + expires_delta
-    else:
-        expire = datetime.now(UTC) + timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(UTC) + (expires_delta or _ACCESS_TOKEN_TTL)
     
     to_encode.update({"exp": expire, "jti": str(uuid4()), "type": "access"})
     
     encoded_jwt = jwt.encode(
         to_encode, 
-        settings.JWT_SECRET_KEY, 
-        algorithm=settings.JWT_ALGORITHM
+        _JWT_SECRET_KEY, 
+        algorithm=_JWT_ALGORITHM
     )
     
     return encoded_jwt
@@ -64,51 +81,80 @@ def create_refresh_token() -> str:
 
 def hash_token(token: str) -> str:
     """Hash a token for secure storage."""
-    return hashlib.sha256(token.encode()).hexdigest()
+    # Tokens are random URL-safe ASCII, so a fast keyless hash is enough
+    return hashlib.blake2b(token.encode('ascii'), digest_size=32).hexdigest()
+
+
+def _token_hash_candidates(token: str) -> Tuple[str, str]:
+    """Current and legacy (SHA-256) hashes of a token for lookups.
+    
+    Refresh tokens stored before the switch to BLAKE2b still match through
+    the legacy hash; it can be dropped once JWT_REFRESH_TOKEN_EXPIRE_DAYS
+    have passed since the switch.
+    """
+    encoded = token.encode('ascii', errors='replace')
+    return (
+        hashlib.blake2b(encoded, digest_size=32).hexdigest(),
+        hashlib.sha256(encoded).hexdigest()
+    )
 
 
 async def store_refresh_token(db: AsyncSession, user_id: str, refresh_token: str) -> RefreshToken:
-    """Store refresh token in database."""
+    """Store refresh token in database, revoking the user's previous ones."""
     token_hash = hash_token(refresh_token)
-    expires_at = datetime.now(UTC) + timedelta(days=settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS)
-    
-    # Revoke all existing refresh tokens for this user
-    await revoke_user_refresh_tokens(db, user_id)
+    expires_at = datetime.now(UTC) + _REFRESH_TOKEN_TTL
     
-    db_token = RefreshToken(
-        id=str(uuid4()),
-        user_id=user_id,
-        token_hash=token_hash,
-        expires_at=expires_at
+    # WITH revoked AS (UPDATE ...) INSERT ... RETURNING: revoke and insert
+    # in one statement instead of UPDATE, INSERT and a refresh SELECT
+    revoked = (
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.is_revoked == False)
+        .values(is_revoked=True)
+        .cte("revoked")
+    )
+    stmt = (
+        insert(RefreshToken)
+        .values(
+            id=str(uuid4()),
+            user_id=user_id,
+            token_hash=token_hash,
+            expires_at=expires_at,
+            is_revoked=False
+        )
+        .add_cte(revoked)
+        .returning(RefreshToken)
     )
     
-    db.add(db_token)
+    result = await db.execute(stmt)
+    db_token = result.scalar_one()
     await db.commit()
-    await db.refresh(db_token)
     
     return db_token
 
 
+# Built once; executed with bound parameters on every /refresh
+_GET_ACTIVE_REFRESH_TOKEN = select(RefreshToken).where(
+    RefreshToken.token_hash.in_(bindparam('token_hashes', expanding=True)),
+    RefreshToken.expires_at > bindparam('now'),
+    RefreshToken.is_revoked == False
+)
+
+
 async def get_refresh_token(db: AsyncSession, token: str) -> Optional[RefreshToken]:
     """Get refresh token by token value if it's valid and not expired."""
-    token_hash = hash_token(token)
-    
     result = await db.execute(
-        select(RefreshToken).where(
-            RefreshToken.token_hash == token_hash,
-            RefreshToken.expires_at > datetime.now(UTC),
-            RefreshToken.is_revoked == False
-        )
+        _GET_ACTIVE_REFRESH_TOKEN,
+        {'token_hashes': list(_token_hash_candidates(token)), 'now': datetime.now(UTC)}
     )
     return result.scalar_one_or_none()
 
 
 async def revoke_refresh_token(db: AsyncSession, refresh_token: str) -> bool:
     """Revoke a specific refresh token."""
-    token_hash = hash_token(refresh_token)
+    token_hashes = _token_hash_candidates(refresh_token)
     
     result = await db.execute(
-        select(RefreshToken).filter(RefreshToken.token_hash == token_hash)
+        select(RefreshToken).filter(RefreshToken.token_hash.in_(token_hashes))
     )
     
     db_token = result.scalar_one_or_none()
@@ -141,28 +187,46 @@ async def cleanup_expired_tokens(db: AsyncSession) -> int:
     return result.rowcount
 
 
-async def create_token_pair(db: AsyncSession, user: User) -> Tuple[str, str]:
-    """Create access and refresh token pair."""
-    # Create access token
+def build_token_pair(user: User) -> Tuple[str, str]:
+    """Create access and refresh token pair without touching the database."""
     access_token = create_access_token(
         data={"sub": user.id, "username": user.username}
     )
-    
-    # Create and store refresh token
     refresh_token = create_refresh_token()
+    
+    return access_token, refresh_token
+
+
+async def create_token_pair(db: AsyncSession, user: User) -> Tuple[str, str]:
+    """Create access and refresh token pair."""
+    access_token, refresh_token = build_token_pair(user)
     await store_refresh_token(db, user.id, refresh_token)
     
     return access_token, refresh_token
 
 
+@lru_cache(maxsize=8192)
+def _decode_token_cached(token: str) -> Dict[str, Any]:
+    """Decode and verify a JWT once per distinct token string.
+    
+    Only successful decodes are cached; callers must re-check "exp", since a
+    cached payload outlives the decode that verified it. The secret is bound
+    at import, so a key rotation (restart) starts with an empty cache.
+    """
+    return jwt.decode(
+        token, 
+        _JWT_SECRET_KEY, 
+        algorithms=_JWT_ALGORITHMS,
+        options={"require": ["exp"]}
+    )
+
+
 def verify_token(token: str, expected_type: str = "access") -> Dict[str, Any]:
     """Verify and decode a JWT token."""
     try:
-        payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM]
-        )
+        payload = _decode_token_cached(token)
+        if payload["exp"] <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
         
         # Check token type
         token_type = payload.get("type", "access")
@@ -189,10 +253,19 @@ async def authenticate_user(db: AsyncSession, username: str, password: str) -> O
     
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    # Password hashing is CPU-bound; keep it off the event loop
+    is_valid, new_hash = await asyncio.to_thread(
+        verify_and_update_password, password, user.hashed_password
+    )
+    if not is_valid:
         return None
     if not user.is_active:
         return None
+    
+    if new_hash is not None:
+        # Legacy bcrypt hash: store the Argon2id rehash
+        user.hashed_password = new_hash
+        await db.commit()
         
     return user
 
@@ -211,7 +284,7 @@ async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
 
 async def create_user(db: AsyncSession, username: str, email: str, password: str, is_admin: bool = False) -> User:
     """Create a new user."""
-    hashed_password = get_password_hash(password)
+    hashed_password = await asyncio.to_thread(get_password_hash, password)
     
     user = User(
         id=str(uuid4()),
@@ -228,31 +301,26 @@ async def create_user(db: AsyncSession, username: str, email: str, password: str
     return user
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
-    """Get current user from JWT token."""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        payload = verify_token(credentials.credentials)
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+async def create_user_if_absent(db: AsyncSession, username: str, email: str, password: str, is_admin: bool = False) -> Optional[User]:
+    """Create a new user in one round-trip; return None if the username or email is taken."""
+    hashed_password = await asyncio.to_thread(get_password_hash, password)
     
-    user = await get_user_by_id(db, user_id)
-    if user is None:
-        raise credentials_exception
+    stmt = (
+        pg_insert(User)
+        .values(
+            id=str(uuid4()),
+            username=username,
+            email=email,
+            hashed_password=hashed_password,
+            is_active=True,
+            is_admin=is_admin
+        )
+        .on_conflict_do_nothing()
+        .returning(User)
+    )
+    result = await db.execute(stmt)
+    user = result.scalar_one_or_none()
+    await db.commit()
     
     return user
 
-
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
-    """Get current active user."""
-    if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
@@ -2,7 +2,7 @@
 Configuration settings for the application.
 """
 
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from typing import Optional
 
 from pydantic import Field
@@ -15,7 +15,8 @@ class Settings(BaseSettings):
     model_config = ConfigDict(
         env_file=".env",
         case_sensitive=True,
-        extra="ignore"  
+        extra="ignore",
+        frozen=True
     )
     
     API_V1_STR: str = "/api/v1"
@@ -28,11 +29,25 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = Field(default="localhost", description="PostgreSQL host")
     POSTGRES_PORT: str = Field(default="5432", description="PostgreSQL port")
     
+    # Async connection pool
+    DB_POOL_SIZE: int = Field(default=20, description="Persistent connections kept in the pool")
+    DB_MAX_OVERFLOW: int = Field(default=40, description="Extra connections opened under load")
+    DB_STATEMENT_CACHE_SIZE: int = Field(default=1024, description="Prepared statements cached per connection")
+    DB_COPY_MIN_ROWS: int = Field(default=500, description="Batches this large are ingested with COPY instead of a multi-row INSERT")
+    
+    # Seconds between refreshes of the DAU/top-events rollups (0 disables)
+    ROLLUP_REFRESH_INTERVAL: int = Field(default=60, description="Rollup refresh interval in seconds")
+    ROLLUP_REFRESH_DAYS: int = Field(default=2, ge=1, description="Trailing days recomputed by each rollup refresh")
+    DAU_USE_HLL: bool = Field(default=False, description="Approximate DAU with postgres-hll (extension must be installed)")
+    
     # External ports (for Docker)
     APP_EXTERNAL_PORT: str = Field(default="8000", description="External application port")
     
     # Rate limiting  
     RATE_LIMIT_PER_MINUTE: int = Field(default=1000, description="Rate limit per minute")
+    RATE_LIMIT_BACKEND: str = Field(default="memory", description="Token bucket store: 'memory' (per worker) or 'redis' (shared)")
+    STATS_CACHE_BACKEND: str = Field(default="memory", description="Statistics response cache: 'memory' (per worker) or 'redis' (shared)")
+    REDIS_URL: str = Field(default="redis://localhost:6379/0", description="Redis URL for RATE_LIMIT_BACKEND=redis and STATS_CACHE_BACKEND=redis")
     
     # Logging
     LOG_LEVEL: str = Field(default="INFO", description="Logging level")
@@ -45,6 +60,7 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = Field(default="HS256", description="JWT algorithm")
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30, description="JWT access token expiration in minutes")
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=7, description="JWT refresh token expiration in days")
+    AUTH_USER_CACHE_TTL: int = Field(default=30, description="Seconds to cache authenticated users per access token (0 disables)")
     
     # ClickHouse settings (cold storage)
     CLICKHOUSE_HOST: str = Field(default="localhost", description="ClickHouse host")
@@ -53,12 +69,12 @@ class Settings(BaseSettings):
     CLICKHOUSE_USER: str = Field(default="default", description="ClickHouse username")
     CLICKHOUSE_PASSWORD: Optional[str] = Field(default="", description="ClickHouse password")
     
-    @property
+    @cached_property
     def DATABASE_URL(self) -> str:
         """Construct database URL from components."""
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
-    @property 
+    @cached_property
     def CLICKHOUSE_URL(self) -> str:
         """Construct ClickHouse URL from components."""
         if self.CLICKHOUSE_PASSWORD:
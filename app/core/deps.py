@@ -2,32 +2,110 @@
 Authentication dependencies and middleware.
 """
 
-from typing import Optional
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database.connection import get_db
 from ..core.auth import verify_token, get_user_by_id
+from ..core.config import settings
 from ..models.database import User
 from ..schemas.auth import TokenData
+from ..services.analytics_service import AnalyticsService
+from ..services.event_service import EventService
 
 
 # Security scheme
 security = HTTPBearer()
 
 
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    Snapshot of the authenticated user's row.
+    
+    Detached from any session, so it can be cached and shared between
+    requests; a handler that needs the ORM object re-attaches it with
+    `await db.merge(User(...), load=False)` or loads it by id.
+    """
+    id: str
+    username: str
+    email: str
+    is_active: bool
+    is_admin: bool
+    created_at: datetime
+    updated_at: datetime
+    
+    @classmethod
+    def from_user(cls, user: User) -> "CurrentUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            created_at=user.created_at,
+            updated_at=user.updated_at
+        )
+
+
+# Short-lived cache of verified access tokens: token digest -> (exp, user
+# snapshot); the only user cache, None when AUTH_USER_CACHE_TTL is 0.
+# Changes made through invalidate_cached_user() apply at once; any other
+# change to a user row (e.g. deactivating it directly in the database) is
+# seen only once the entry expires, up to AUTH_USER_CACHE_TTL seconds later.
+_auth_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=10_000, ttl=settings.AUTH_USER_CACHE_TTL)
+    if settings.AUTH_USER_CACHE_TTL > 0 else None
+)
+
+
+def _token_cache_key(token: str) -> bytes:
+    """Build a compact cache key for a raw bearer token."""
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+
+def invalidate_cached_user(user_id: str) -> None:
+    """Drop cached authentications of a user (e.g. after logout or role change)."""
+    if _auth_cache is None:
+        return
+    stale_keys = [
+        key for key, (_, user) in list(_auth_cache.items())
+        if user.id == user_id
+    ]
+    for key in stale_keys:
+        _auth_cache.pop(key, None)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
-) -> User:
-    """Get current authenticated user."""
+) -> CurrentUser:
+    """Get a snapshot of the current authenticated user."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    cache_key = _token_cache_key(credentials.credentials)
+    cached: Optional[Tuple[float, CurrentUser]] = (
+        _auth_cache.get(cache_key) if _auth_cache is not None else None
+    )
+    if cached is not None:
+        expires_at, user = cached
+        if expires_at > time.time():
+            return user
+        _auth_cache.pop(cache_key, None)
+    
     try:
         # Verify token
         payload = verify_token(credentials.credentials)
@@ -50,13 +128,19 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Inactive user"
         )
+    
+    # A snapshot, not the ORM instance: the request session may roll back
+    # (expiring it) and is closed before the cached entry is next used
+    current_user = CurrentUser.from_user(user)
+    if _auth_cache is not None:
+        _auth_cache[cache_key] = (payload["exp"], current_user)
         
-    return user
+    return current_user
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     """Get current active user."""
     if not current_user.is_active:
         raise HTTPException(
@@ -67,8 +151,8 @@ async def get_current_active_user(
 
 
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_active_user)
+) -> CurrentUser:
     """Get current admin user."""
     if not current_user.is_admin:
         raise HTTPException(
@@ -101,3 +185,13 @@ def get_optional_current_user():
             return None
     
     return _get_optional_user
+
+
+def get_event_service(db: AsyncSession = Depends(get_db)) -> EventService:
+    """Provide an EventService bound to the request's database session."""
+    return EventService(db)
+
+
+def get_analytics_service(db: AsyncSession = Depends(get_db)) -> AnalyticsService:
+    """Provide an AnalyticsService bound to the request's database session."""
+    return AnalyticsService(db)
@@ -6,12 +6,20 @@ import logging
 import sys
 from typing import Any, Dict
 
+import orjson
 import structlog
 from structlog.stdlib import LoggerFactory
 
 from .config import settings
 
 
+def _orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    """orjson-backed serializer for structlog's JSONRenderer."""
+    return orjson.dumps(
+        obj, default=kwargs.get("default"), option=orjson.OPT_NON_STR_KEYS
+    ).decode()
+
+
 def setup_logging() -> None:
     """Configure structured logging."""
     
@@ -26,7 +34,7 @@ def setup_logging() -> None:
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
             structlog.processors.UnicodeDecoder(),
-            structlog.processors.JSONRenderer()
+            structlog.processors.JSONRenderer(serializer=_orjson_dumps)
         ],
         context_class=dict,
         logger_factory=LoggerFactory(),
@@ -2,13 +2,25 @@
 Async database connection configuration for events API.
 """
 
+import asyncio
+
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from typing import AsyncGenerator
 
 from ..core.config import settings
+from ..core.logging import get_logger
 from ..models.database import Base
 
+logger = get_logger(__name__)
+
+POOL_SIZE = settings.DB_POOL_SIZE
+MAX_OVERFLOW = settings.DB_MAX_OVERFLOW
+POOL_KEEPALIVE_INTERVAL_SECONDS = 30
+# Pings in flight at once, so a keepalive pass never competes with requests
+# for more than a couple of pooled connections
+POOL_KEEPALIVE_CONCURRENCY = 2
+
 
 def get_database_url(async_url: bool = False) -> str:
     """Get database URL, optionally for async connection."""
@@ -21,8 +33,25 @@ def get_database_url(async_url: bool = False) -> str:
 async_engine = create_async_engine(
     get_database_url(async_url=True),
     echo=settings.DEBUG,
-    pool_pre_ping=True,
-    pool_recycle=3600
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    # Idle connections are checked by keep_pool_alive() instead of a
+    # round-trip on every checkout. Trade-off: a connection that breaks
+    # between two keepalive passes (server restart, failover, idle timeout)
+    # fails the one request that checks it out before SQLAlchemy invalidates
+    # it, where pre_ping would have reconnected transparently.
+    pool_pre_ping=False,
+    pool_recycle=1800,
+    connect_args={
+        # asyncpg's own cache and SQLAlchemy's asyncpg adapter cache
+        'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+        'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+        'server_settings': {
+            # JIT compilation only slows down short OLTP statements
+            'jit': 'off',
+            'application_name': 'events-api',
+        },
+    }
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -43,6 +72,38 @@ async def init_db():
     sync_engine.dispose()
 
 
+async def warm_pool() -> None:
+    """Open POOL_SIZE connections up front so first requests skip the connect."""
+    connections = await asyncio.gather(*[async_engine.connect() for _ in range(POOL_SIZE)])
+    await asyncio.gather(*[conn.close() for conn in connections])
+
+
+async def _ping_idle_connections() -> None:
+    """Run SELECT 1 over every connection currently idle in the pool."""
+    semaphore = asyncio.Semaphore(POOL_KEEPALIVE_CONCURRENCY)
+    
+    async def ping() -> None:
+        async with semaphore, async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    
+    idle = async_engine.pool.checkedin()
+    results = await asyncio.gather(*[ping() for _ in range(idle)], return_exceptions=True)
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    if failed:
+        # Broken connections are invalidated by SQLAlchemy and reopened lazily
+        logger.warning("Pool keepalive found broken connections", idle=idle, failed=failed)
+
+
+async def keep_pool_alive(interval: float = POOL_KEEPALIVE_INTERVAL_SECONDS) -> None:
+    """Background task replacing pool_pre_ping: ping idle connections periodically."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await _ping_idle_connections()
+        except Exception:
+            logger.exception("Pool keepalive failed")
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Async database dependency for FastAPI routes.
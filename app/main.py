@@ -8,14 +8,26 @@ import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-from fastapi import FastAPI
+from clickhouse_connect.driver.exceptions import ClickHouseError
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.exc import SQLAlchemyError
 
 from .api.v1 import events, stats, auth, cold_storage
 from .core.config import settings
-from .core.logging import setup_logging
+from .core.logging import get_logger, setup_logging
+from .database.connection import async_engine, init_db, keep_pool_alive, warm_pool
 
 from .middleware.rate_limit import RateLimitMiddleware
+from .services.analytics_service import refresh_rollups_periodically
+
+logger = get_logger(__name__)
+
+# Storage errors are reported with fixed messages instead of leaking driver details
+COLD_STORAGE_ERROR_CONTENT = {"detail": "Cold storage query failed"}
+DATABASE_ERROR_CONTENT = {"detail": "Database query failed"}
 
 
 @asynccontextmanager
@@ -23,11 +35,16 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Lifecycle events for the FastAPI application."""
     # Startup
     setup_logging()
-    from .database.connection import init_db
     await init_db()
+    await warm_pool()
+    background_tasks = [asyncio.create_task(keep_pool_alive())]
+    if settings.ROLLUP_REFRESH_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(refresh_rollups_periodically()))
     yield
     # Shutdown
-    pass
+    for task in background_tasks:
+        task.cancel()
+    await async_engine.dispose()
 
 
 def create_app() -> FastAPI:
@@ -38,10 +55,13 @@ def create_app() -> FastAPI:
         version="1.0.0",
         docs_url="/docs",
         redoc_url="/redoc",
-        lifespan=lifespan
+        lifespan=lifespan,
+        # orjson encodes the UUID/datetime-heavy payloads natively
+        default_response_class=ORJSONResponse
     )
 
     # Middleware
+    app.add_middleware(GZipMiddleware, minimum_size=1024)  # /events and stats payloads compress well
     app.add_middleware(RateLimitMiddleware)
     app.add_middleware(
         CORSMiddleware,
@@ -51,6 +71,17 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Exception handlers
+    @app.exception_handler(ClickHouseError)
+    async def clickhouse_error_handler(request: Request, exc: ClickHouseError) -> ORJSONResponse:
+        logger.error("ClickHouse error", path=request.url.path, error=str(exc))
+        return ORJSONResponse(status_code=500, content=COLD_STORAGE_ERROR_CONTENT)
+
+    @app.exception_handler(SQLAlchemyError)
+    async def database_error_handler(request: Request, exc: SQLAlchemyError) -> ORJSONResponse:
+        logger.error("Database error", path=request.url.path, error=str(exc))
+        return ORJSONResponse(status_code=500, content=DATABASE_ERROR_CONTENT)
+
     # Health endpoint
     @app.get("/health")
     async def health():
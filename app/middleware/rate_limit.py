@@ -1,116 +1,238 @@
 import time
-from collections import defaultdict
-from typing import Dict, Tuple
+from collections import OrderedDict
+from typing import Optional, Protocol, Tuple
 
-from fastapi import HTTPException, Request, Response, status
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from ..core.config import settings
 from ..core.logging import get_logger
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional, only needed for RATE_LIMIT_BACKEND=redis
+    aioredis = None
+
 logger = get_logger(__name__)
 
+# Buckets run on the monotonic clock; this offset converts it to epoch
+# seconds for the X-RateLimit-Reset header without another clock read
+_MONOTONIC_TO_EPOCH = time.time() - time.monotonic()
+
+# Paths served without rate limiting
+EXCLUDED_PATHS = frozenset({"/docs", "/redoc", "/openapi.json", "/health"})
+
+RATE_LIMITED_CONTENT = {"detail": "Rate limit exceeded. Please try again later."}
+
 
 class TokenBucket:
     """Token bucket for rate limiting."""
     
-    def __init__(self, capacity: int, refill_rate: float):
+    # One instance per client; slots drop the per-instance __dict__
+    __slots__ = ("capacity", "refill_rate", "tokens", "last_refill")
+    
+    def __init__(self, capacity: int, refill_rate: float, now: float = None):
         self.capacity = capacity
         self.refill_rate = refill_rate  # tokens per second
         self.tokens = capacity
-        self.last_refill = time.time()
+        self.last_refill = time.monotonic() if now is None else now
     
-    def consume(self, tokens: int = 1) -> bool:
-        """Try to consume tokens. Returns True if successful."""
-        now = time.time()
+    def consume(self, tokens: int = 1, now: float = None) -> bool:
+        """Try to consume tokens. Returns True if successful.
         
-        # Refill tokens based on time elapsed
-        elapsed = now - self.last_refill
-        self.tokens = min(
-            self.capacity,
-            self.tokens + elapsed * self.refill_rate
-        )
+        `now` is a time.monotonic() reading the caller may share across calls.
+        """
+        if now is None:
+            now = time.monotonic()
+        
+        # Refill tokens based on time elapsed; locals and a plain comparison
+        # instead of min() keep this to one attribute write per field
+        available = self.tokens + (now - self.last_refill) * self.refill_rate
+        if available > self.capacity:
+            available = self.capacity
         self.last_refill = now
         
         # Check if we have enough tokens
-        if self.tokens >= tokens:
-            self.tokens -= tokens
+        if available >= tokens:
+            self.tokens = available - tokens
             return True
         
+        self.tokens = available
         return False
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware using in-memory token buckets."""
+class RateLimitBackend(Protocol):
+    """Storage for per-client token buckets."""
     
-    def __init__(self, app, rate_limit_per_minute: int = None):
-        super().__init__(app)
-        self.rate_limit_per_minute = rate_limit_per_minute or settings.RATE_LIMIT_PER_MINUTE
-        self.buckets: Dict[str, TokenBucket] = defaultdict(
-            lambda: TokenBucket(
-                capacity=self.rate_limit_per_minute,
-                refill_rate=self.rate_limit_per_minute / 60.0  
+    async def consume(
+        self, client_id: str, capacity: int, refill_rate: float, now: float
+    ) -> Tuple[bool, int]:
+        """Take one token for `client_id`. Returns (allowed, tokens remaining).
+        
+        `now` is the caller's time.monotonic() reading for this request.
+        """
+        ...
+
+
+class InMemoryRateLimitBackend:
+    """Per-process buckets; each worker enforces the limit on its own."""
+    
+    def __init__(self, max_clients: int = 100_000):
+        # LRU order: the least recently seen client is evicted once
+        # max_clients is exceeded, which bounds memory under spoofed IPs
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.max_clients = max_clients
+    
+    async def consume(
+        self, client_id: str, capacity: int, refill_rate: float, now: float
+    ) -> Tuple[bool, int]:
+        bucket = self.buckets.get(client_id)
+        if bucket is None:
+            bucket = self.buckets[client_id] = TokenBucket(
+                capacity=capacity,
+                refill_rate=refill_rate,
+                now=now
             )
-        )
-        self.cleanup_interval = 300  # 5 minutes
-        self.last_cleanup = time.time()
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client_id)
+        
+        allowed = bucket.consume(now=now)
+        return allowed, int(bucket.tokens)
+
+
+# Refill and take a token in one atomic step. The bucket is timed with the
+# Redis server clock so every worker sees the same elapsed time, and the key
+# expires once it would have refilled anyway.
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local last = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - last) * refill_rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, math.floor(tokens)}
+"""
+
+
+class RedisTokenBucketBackend:
+    """Buckets shared by all workers through Redis, one round trip per request."""
     
-    def _get_client_id(self, request: Request) -> str:
-        """Get client identifier for rate limiting."""
-        client_ip = (
-            request.headers.get("X-Forwarded-For", "").split(",")[0].strip() or
-            request.headers.get("X-Real-IP", "") or
-            request.client.host if request.client else "unknown"
+    def __init__(self, url: str, key_prefix: str = "ratelimit:"):
+        if aioredis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self.client = aioredis.from_url(url)
+        self.key_prefix = key_prefix
+        self._script = self.client.register_script(_TOKEN_BUCKET_LUA)
+    
+    async def consume(
+        self, client_id: str, capacity: int, refill_rate: float, now: float
+    ) -> Tuple[bool, int]:
+        allowed, remaining = await self._script(
+            keys=[self.key_prefix + client_id],
+            args=[capacity, refill_rate]
         )
-        return client_ip
+        return bool(allowed), int(remaining)
+
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    """Build the backend selected by settings.RATE_LIMIT_BACKEND."""
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBucketBackend(settings.REDIS_URL)
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return InMemoryRateLimitBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND!r}")
+
+
+class RateLimitMiddleware:
+    """Rate limiting middleware using token buckets from a pluggable backend.
     
-    def _cleanup_old_buckets(self):
-        """Clean up old unused buckets to prevent memory leaks."""
-        now = time.time()
-        if now - self.last_cleanup > self.cleanup_interval:
-            cutoff_time = now - 3600
-            to_remove = [
-                client_id for client_id, bucket in self.buckets.items()
-                if bucket.last_refill < cutoff_time
-            ]
-            
-            for client_id in to_remove:
-                del self.buckets[client_id]
-            
-            self.last_cleanup = now
-            
-            if to_remove:
-                logger.info(f"Cleaned up {len(to_remove)} old rate limit buckets")
+    Plain ASGI rather than BaseHTTPMiddleware: no per-request task group or
+    request/response stream wrapping, only the response start is touched.
+    """
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate_limit_per_minute: int = None,
+        backend: Optional[RateLimitBackend] = None
+    ):
+        self.app = app
+        self.rate_limit_per_minute = rate_limit_per_minute or settings.RATE_LIMIT_PER_MINUTE
+        self.refill_rate = self.rate_limit_per_minute / 60.0
+        self.backend = backend or create_rate_limit_backend()
+        # Header values are formatted once; Reset only changes once a second
+        self._limit_header = str(self.rate_limit_per_minute)
+        self._reset_second = 0
+        self._reset_header = ""
+    
+    def _get_client_id(self, scope: Scope, headers: Headers) -> str:
+        """Get client identifier for rate limiting."""
+        forwarded_for = headers.get("X-Forwarded-For")
+        if forwarded_for:
+            # First hop only; no list allocation for the usual single-IP header
+            comma = forwarded_for.find(",")
+            client_ip = (forwarded_for[:comma] if comma >= 0 else forwarded_for).strip()
+            if client_ip:
+                return client_ip
+        client = scope.get("client")
+        return headers.get("X-Real-IP") or (client[0] if client else "unknown")
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Process request with rate limiting."""
         
-        if request.url.path in ["/docs", "/redoc", "/openapi.json", "/health"]:
-            return await call_next(request)
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        
+        # One clock read per request, shared by the bucket and the headers
+        now = time.monotonic()
         
-        client_id = self._get_client_id(request)
-        bucket = self.buckets[client_id]
+        client_id = self._get_client_id(scope, Headers(scope=scope))
+        allowed, remaining = await self.backend.consume(
+            client_id, self.rate_limit_per_minute, self.refill_rate, now
+        )
         
-        if not bucket.consume():
+        if not allowed:
             logger.warning(
                 "Rate limit exceeded",
                 client_id=client_id,
-                path=request.url.path,
-                method=request.method
+                path=scope["path"],
+                method=scope["method"]
             )
-            raise HTTPException(
+            response = ORJSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please try again later.",
+                content=RATE_LIMITED_CONTENT,
                 headers={"Retry-After": "60"}
             )
+            await response(scope, receive, send)
+            return
         
-        response = await call_next(request)
-        
-        response.headers["X-RateLimit-Limit"] = str(self.rate_limit_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(int(bucket.tokens))
-        response.headers["X-RateLimit-Reset"] = str(int(time.time() + 60))
+        second = int(now + _MONOTONIC_TO_EPOCH)
+        if second != self._reset_second:
+            self._reset_second = second
+            self._reset_header = str(second + 60)
+        rate_limit_headers = (
+            (b"x-ratelimit-limit", self._limit_header.encode()),
+            (b"x-ratelimit-remaining", str(remaining).encode()),
+            (b"x-ratelimit-reset", self._reset_header.encode()),
+        )
         
-    
-        self._cleanup_old_buckets()
+        async def send_with_rate_limit_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *rate_limit_headers]
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_rate_limit_headers)
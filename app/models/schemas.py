@@ -1,11 +1,15 @@
 """
 Pydantic models for API requests and responses.
+
+The ingest hot path additionally has msgspec structs that decode the raw
+request body in C; they mirror the constraints of the Pydantic models.
 """
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Annotated, Dict, List, Optional
 from uuid import UUID
 
+import msgspec
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 
 
@@ -43,6 +47,22 @@ class EventsRequest(BaseModel):
     events: List[EventInput] = Field(..., description="List of events", min_length=1, max_length=1000)
 
 
+class EventInputStruct(msgspec.Struct):
+    """msgspec counterpart of EventInput used by the ingest endpoint."""
+    
+    event_id: UUID
+    occurred_at: datetime
+    user_id: Annotated[str, msgspec.Meta(min_length=1)]
+    event_type: Annotated[str, msgspec.Meta(min_length=1, max_length=100)]
+    properties: Dict[str, Any] = {}
+
+
+class EventsRequestStruct(msgspec.Struct):
+    """msgspec counterpart of EventsRequest used by the ingest endpoint."""
+    
+    events: Annotated[List[EventInputStruct], msgspec.Meta(min_length=1, max_length=1000)]
+
+
 class EventResponse(BaseModel):
     """Model for event response."""
     
@@ -2,17 +2,25 @@
 Analytics service for generating statistics and reports.
 """
 
+import asyncio
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional
 
-from sqlalchemy import and_, func, distinct, select
+from sqlalchemy import BigInteger, and_, cast, func, distinct, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..core.config import settings
 from ..core.logging import get_logger
-from ..models.database import Event
+from ..database.connection import AsyncSessionLocal
+from ..models.database import (
+    Event, ROLLUP_REBUILD_STATEMENTS, ROLLUP_REFRESH_STATEMENTS, daily_active_users, daily_event_type_counts
+)
 
 logger = get_logger(__name__)
 
+# Advisory lock key so only one worker refreshes the rollups at a time
+ROLLUP_REFRESH_LOCK_ID = 0x726F6C6C  # "roll"
+
 
 class AnalyticsService:
     """Service for analytics operations."""
@@ -21,17 +29,16 @@ class AnalyticsService:
         self.db = db
     
     async def get_basic_stats(self) -> dict:
-        """Get basic event statistics."""
-        total_result = await self.db.execute(select(func.count(Event.event_id)))
-        total_events = total_result.scalar()
-        
-        # Unique users
-        users_result = await self.db.execute(select(func.count(distinct(Event.user_id))))
-        unique_users = users_result.scalar()
-        
-        # Event types
-        types_result = await self.db.execute(select(func.count(distinct(Event.event_type))))
-        event_types = types_result.scalar()
+        """Get basic event statistics in a single scan of the events table."""
+        result = await self.db.execute(
+            select(
+                # count(*) skips the per-row NULL check on event_id
+                func.count(),
+                func.count(distinct(Event.user_id)),
+                func.count(distinct(Event.event_type))
+            )
+        )
+        total_events, unique_users, event_types = result.one()
         
         logger.info(
             "Generated basic stats",
@@ -46,34 +53,51 @@ class AnalyticsService:
             "event_types_count": event_types
         }
     
-    async def get_top_events(self, from_date: datetime = None, to_date: datetime = None, limit: int = 10) -> List[dict]:
-        """Get top event types by count."""
-        query = select(
-            Event.event_type,
-            func.count(Event.event_id).label('count')
-        )
+    async def get_top_events(
+        self,
+        from_date: datetime = None,
+        to_date: datetime = None,
+        limit: int = 10,
+        properties: Optional[Dict[str, str]] = None
+    ) -> List[dict]:
+        """Get top event types by count.
         
-        if from_date and to_date:
-            from datetime import timedelta
-            end_date = to_date + timedelta(days=1)
-            query = query.where(
-                and_(
-                    Event.occurred_at >= from_date,
-                    Event.occurred_at < end_date
+        Unfiltered queries sum the daily_event_type_counts rollup. `properties`
+        keeps only events whose JSONB properties contain those key/value
+        pairs; that filter runs on the raw events table via the GIN index.
+        """
+        if properties:
+            query = select(
+                Event.event_type,
+                func.count(Event.event_id).label('count')
+            ).where(Event.properties.contains(properties))
+            
+            if from_date and to_date:
+                end_date = to_date + timedelta(days=1)
+                query = query.where(
+                    and_(
+                        Event.occurred_at >= from_date,
+                        Event.occurred_at < end_date
+                    )
                 )
-            )
-        
-        query = query.group_by(Event.event_type).order_by(func.count(Event.event_id).desc()).limit(limit)
+            
+            query = query.group_by(Event.event_type).order_by(func.count(Event.event_id).desc()).limit(limit)
+        else:
+            rollup = daily_event_type_counts.c
+            total = cast(func.sum(rollup.n), BigInteger)
+            query = select(rollup.event_type, total.label('count'))
+            
+            if from_date and to_date:
+                query = query.where(rollup.date.between(from_date.date(), to_date.date()))
+            
+            query = query.group_by(rollup.event_type).order_by(total.desc()).limit(limit)
         
         result = await self.db.execute(query)
-        rows = result.all()
-        
-        top_events = []
-        for row in rows:
-            top_events.append({
-                "event_type": row.event_type,
-                "count": row.count
-            })
+        # Build the response dicts in one pass over the buffered result
+        top_events = [
+            {"event_type": event_type, "count": count}
+            for event_type, count in result
+        ]
         
         logger.info(
             "Generated top events",
@@ -84,26 +108,20 @@ class AnalyticsService:
         return top_events
     
     async def get_dau_stats(self, from_date: datetime, to_date: datetime) -> List[dict]:
-        """Get Daily Active Users statistics."""
+        """Get Daily Active Users statistics from the daily_active_users rollup."""
+        rollup = daily_active_users.c
         query = select(
-            func.date(Event.occurred_at).label('date'),
-            func.count(distinct(Event.user_id)).label('unique_users')
+            rollup.date,
+            rollup.unique_users
         ).where(
-            and_(
-                Event.occurred_at >= from_date,
-                Event.occurred_at < (to_date + timedelta(days=1))
-            )
-        ).group_by(func.date(Event.occurred_at)).order_by(func.date(Event.occurred_at))
+            rollup.date.between(from_date.date(), to_date.date())
+        ).order_by(rollup.date)
         
         result = await self.db.execute(query)
-        rows = result.all()
-        
-        dau_stats = []
-        for row in rows:
-            dau_stats.append({
-                "date": str(row.date),
-                "unique_users": row.unique_users
-            })
+        dau_stats = [
+            {"date": day.isoformat(), "unique_users": unique_users}
+            for day, unique_users in result
+        ]
         
         logger.info(
             "Generated DAU stats",
@@ -125,3 +143,41 @@ class AnalyticsService:
         )
         
         return []
+    
+    async def refresh_rollups(self, days: Optional[int] = settings.ROLLUP_REFRESH_DAYS, wait: bool = False) -> bool:
+        """Recompute the last `days` days of the daily rollups (all of events if None).
+        
+        Older days keep their stored counts; events backfilled into them only
+        show up after a full refresh. Returns False without refreshing when
+        another worker holds the lock, unless `wait` is set, in which case it
+        blocks until that refresh has finished.
+        """
+        if wait:
+            await self.db.execute(select(func.pg_advisory_xact_lock(ROLLUP_REFRESH_LOCK_ID)))
+        else:
+            locked = await self.db.scalar(select(func.pg_try_advisory_xact_lock(ROLLUP_REFRESH_LOCK_ID)))
+            if not locked:
+                await self.db.rollback()
+                return False
+        
+        if days is None:
+            for statement in ROLLUP_REBUILD_STATEMENTS:
+                await self.db.execute(text(statement))
+        else:
+            for statement in ROLLUP_REFRESH_STATEMENTS:
+                await self.db.execute(text(statement), {"days": days})
+        await self.db.commit()
+        
+        logger.info("Refreshed analytics rollups", days=days)
+        return True
+
+
+async def refresh_rollups_periodically(interval: float = settings.ROLLUP_REFRESH_INTERVAL) -> None:
+    """Background task keeping the recent rollup days at most `interval` seconds stale."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await AnalyticsService(db).refresh_rollups()
+        except Exception:
+            logger.exception("Rollup refresh failed")
@@ -3,32 +3,68 @@ Data archival service for moving data from hot storage (PostgreSQL) to cold stor
 Implements hot/cold data storage strategy.
 """
 
+import io
 import logging
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
 
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, and_
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy import select, and_, func, literal_column, tuple_
 
-from ..database.connection import get_db
+from ..database.connection import AsyncSessionLocal, get_db
 from ..models.database import Event
 from ..services.clickhouse_service import clickhouse_service
 
 logger = logging.getLogger(__name__)
 
+# How long a get_archival_candidates() result is shared between callers
+CANDIDATES_CACHE_TTL_SECONDS = 10
+
+# Windows archived concurrently, and windows queued ahead of them
+ARCHIVAL_CONCURRENCY = 4
+ARCHIVAL_QUEUE_SIZE = ARCHIVAL_CONCURRENCY * 2
+
+# Column order matches ClickHouseService.ARCHIVE_COLUMNS; occurred_at is
+# rendered as UTC ISO-8601 so it parses the same whatever the session TimeZone
+ARCHIVE_WINDOW_QUERY = """
+    DELETE FROM events
+    WHERE {conditions}
+    RETURNING
+        event_id,
+        user_id,
+        event_type,
+        to_char(occurred_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.MS"Z"'),
+        COALESCE(properties, '{{}}'::jsonb)
+"""
+
+
+async def _begin_driver_transaction(connection: AsyncConnection) -> None:
+    """
+    Open the session's transaction on the underlying asyncpg connection.
+    
+    SQLAlchemy's asyncpg adapter only sends BEGIN with the first statement
+    it executes, so a raw driver call made before that runs in autocommit.
+    The archival DELETE must run inside this transaction: rolling it back
+    is what keeps the rows in events when ClickHouse rejects the batch.
+    """
+    await connection.exec_driver_sql("SELECT 1")
+
 
 class DataArchivalService:
     """Service for managing data archival from hot to cold storage."""
     
     def __init__(self, 
                  hot_retention_days: int = 7,  # Keep data in PostgreSQL for 7 days
-                 batch_size: int = 1000,      # Process in batches
+                 batch_size: int = 50_000,    # Events per batch; one ClickHouse insert (and part) each
                  max_archive_age_days: int = 30  # Don't archive data older than 30 days
                  ):
         self.hot_retention_days = hot_retention_days
         self.batch_size = batch_size
         self.max_archive_age_days = max_archive_age_days
+        self._candidates_task: Optional[asyncio.Task] = None
+        self._candidates_started_at = 0.0
     
     async def archive_old_events(self) -> Dict[str, Any]:
         """
@@ -38,7 +74,7 @@ class DataArchivalService:
             Dict with archival statistics
         """
         stats = {
-            'started_at': datetime.now(),
+            'started_at': datetime.now(timezone.utc),
             'events_processed': 0,
             'events_archived': 0,
             'events_deleted': 0,
@@ -47,8 +83,10 @@ class DataArchivalService:
         }
         
         try:
-            archive_threshold = datetime.now() - timedelta(days=self.hot_retention_days)
-            max_age_threshold = datetime.now() - timedelta(days=self.max_archive_age_days)
+            # Aware UTC: occurred_at is timestamptz, and asyncpg reads naive values as UTC
+            now = datetime.now(timezone.utc)
+            archive_threshold = now - timedelta(days=self.hot_retention_days)
+            max_age_threshold = now - timedelta(days=self.max_archive_age_days)
             
             logger.info(f"Starting archival process for events between {max_age_threshold} and {archive_threshold}")
             
@@ -58,8 +96,10 @@ class DataArchivalService:
                 )
                 break  # Exit after first iteration
             
-            stats['completed_at'] = datetime.now()
+            stats['completed_at'] = datetime.now(timezone.utc)
             stats['duration_seconds'] = (stats['completed_at'] - stats['started_at']).total_seconds()
+            self.invalidate_candidates_cache()
+            clickhouse_service.invalidate_range_cache()
             
             logger.info(f"Archival completed: {stats}")
             return stats
@@ -68,7 +108,10 @@ class DataArchivalService:
             error_msg = f"Archival process failed: {str(e)}"
             logger.error(error_msg)
             stats['errors'].append(error_msg)
-            stats['completed_at'] = datetime.now()
+            stats['completed_at'] = datetime.now(timezone.utc)
+            # earlier batches may have been archived
+            self.invalidate_candidates_cache()
+            clickhouse_service.invalidate_range_cache()
             return stats
     
     async def _process_archival_batches(self, 
@@ -77,112 +120,237 @@ class DataArchivalService:
                                       max_age_threshold: datetime,
                                       stats: Dict[str, Any]):
         """Process archival in batches to avoid memory issues."""
+        # The producer walks the keyset index on `db` and queues disjoint
+        # (start, end] windows; consumers archive and delete windows
+        # concurrently, one transaction each, so PostgreSQL reads, ClickHouse
+        # inserts and commits overlap. The bounded queue is the backpressure.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=ARCHIVAL_QUEUE_SIZE)
+        
+        consumers = [
+            asyncio.create_task(
+                self._consume_windows(queue, archive_threshold, max_age_threshold, stats)
+            )
+            for _ in range(ARCHIVAL_CONCURRENCY)
+        ]
+        try:
+            await self._produce_windows(db, queue, archive_threshold, max_age_threshold)
+            await queue.join()
+        finally:
+            for consumer in consumers:
+                consumer.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+        
+        logger.info("No more events to archive")
+    
+    async def _produce_windows(self,
+                               db: AsyncSession,
+                               queue: asyncio.Queue,
+                               archive_threshold: datetime,
+                               max_age_threshold: datetime) -> None:
+        """Queue consecutive keyset windows of batch_size events each."""
+        # Keyset position (occurred_at, event_id): each query resumes the
+        # index range scan there instead of walking over rows already handled
+        last_key = None
         
         while True:
-            # Get batch of events to archive
-            query = select(Event).where(
-                and_(
-                    Event.occurred_at < archive_threshold,
-                    Event.occurred_at > max_age_threshold
-                )
-            ).limit(self.batch_size)
-            
-            result = await db.execute(query)
-            events = result.scalars().all()
-            
-            if not events:
-                logger.info("No more events to archive")
+            # Last key of the next batch; None once fewer than batch_size remain
+            batch_end = await self._batch_end_key(db, last_key, archive_threshold, max_age_threshold)
+            await queue.put((last_key, batch_end))
+            if batch_end is None:
                 break
-            
-            # Convert events to dictionary format for ClickHouse
-            events_data = []
-            event_ids = []
-            
-            for event in events:
-                events_data.append({
-                    'event_id': event.event_id,
-                    'user_id': event.user_id,
-                    'event_type': event.event_type,
-                    'occurred_at': event.occurred_at,
-                    'properties': event.properties_dict
-                })
-                event_ids.append(event.event_id)
-            
-            stats['events_processed'] += len(events_data)
-            
-            # Archive to ClickHouse
-            archive_success = await clickhouse_service.archive_events(events_data)
-            
-            if archive_success:
-                stats['events_archived'] += len(events_data)
-                
-                # Delete from PostgreSQL only if ClickHouse archive succeeded
-                delete_success = await self._delete_archived_events(db, event_ids)
-                
-                if delete_success:
-                    stats['events_deleted'] += len(event_ids)
-                    await db.commit()
-                    logger.info(f"Successfully archived and deleted {len(events_data)} events")
-                else:
-                    await db.rollback()
-                    error_msg = f"Failed to delete {len(events_data)} events from PostgreSQL after successful ClickHouse archive"
+            last_key = batch_end
+        
+        await db.rollback()  # end the read-only transaction
+    
+    async def _consume_windows(self,
+                               queue: asyncio.Queue,
+                               archive_threshold: datetime,
+                               max_age_threshold: datetime,
+                               stats: Dict[str, Any]) -> None:
+        """Archive windows from the queue on a session of its own."""
+        db = AsyncSessionLocal()
+        try:
+            while True:
+                batch_start, batch_end = await queue.get()
+                try:
+                    await self._archive_window(
+                        db, batch_start, batch_end, archive_threshold, max_age_threshold, stats
+                    )
+                except Exception as e:
+                    error_msg = f"Failed to archive batch: {e}"
                     logger.error(error_msg)
                     stats['errors'].append(error_msg)
-            else:
-                error_msg = f"Failed to archive {len(events_data)} events to ClickHouse, skipping deletion"
-                logger.error(error_msg)
-                stats['errors'].append(error_msg)
-            
-            stats['batches_processed'] += 1
-            
-            # Small delay to avoid overwhelming the databases
-            await asyncio.sleep(0.1)
+                    # The failure may have broken the connection, so closing
+                    # (which rolls back) can raise too; either way the next
+                    # window gets a fresh session rather than killing this
+                    # consumer and leaving queue.join() waiting forever
+                    try:
+                        await db.close()
+                    except Exception as close_error:
+                        logger.warning(f"Failed to close archival session: {close_error}")
+                    db = AsyncSessionLocal()
+                finally:
+                    queue.task_done()
+        finally:
+            await db.close()
     
-    async def _delete_archived_events(self, db: AsyncSession, event_ids: List[str]) -> bool:
-        """Delete events from PostgreSQL after successful archival."""
-        try:
-            delete_query = delete(Event).where(Event.event_id.in_(event_ids))
-            await db.execute(delete_query)
-            return True
-        except Exception as e:
-            logger.error(f"Failed to delete events from PostgreSQL: {e}")
+    async def _archive_window(self,
+                              db: AsyncSession,
+                              batch_start: Optional[Tuple[datetime, Any]],
+                              batch_end: Optional[Tuple[datetime, Any]],
+                              archive_threshold: datetime,
+                              max_age_threshold: datetime,
+                              stats: Dict[str, Any]) -> None:
+        """Move one keyset window to ClickHouse in a single PostgreSQL transaction."""
+        # Delete the batch and stream it out as TSV in one statement; the
+        # transaction stays open until ClickHouse has accepted the block
+        block, events_count = await self._copy_out_window(
+            db, batch_start, batch_end, archive_threshold, max_age_threshold
+        )
+        
+        if not events_count:
+            await db.rollback()
+            return
+        
+        stats['events_processed'] += events_count
+        
+        # Archive to ClickHouse
+        archive_success = await clickhouse_service.archive_tsv(block, events_count)
+        
+        if archive_success:
+            # Commit the delete only if ClickHouse archive succeeded
+            await db.commit()
+            stats['events_archived'] += events_count
+            stats['events_deleted'] += events_count
+            logger.info(f"Successfully archived and deleted {events_count} events")
+        else:
+            await db.rollback()
+            error_msg = f"Failed to archive {events_count} events to ClickHouse, skipping deletion"
+            logger.error(error_msg)
+            stats['errors'].append(error_msg)
+        
+        stats['batches_processed'] += 1
+    
+    async def _batch_end_key(self,
+                             db: AsyncSession,
+                             last_key: Optional[Tuple[datetime, Any]],
+                             archive_threshold: datetime,
+                             max_age_threshold: datetime) -> Optional[Tuple[datetime, Any]]:
+        """Key of the batch_size-th event after last_key, read from the keyset index."""
+        query = select(Event.occurred_at, Event.event_id).where(
+            and_(
+                Event.occurred_at < archive_threshold,
+                Event.occurred_at > max_age_threshold
+            )
+        )
+        if last_key is not None:
+            query = query.where(tuple_(Event.occurred_at, Event.event_id) > last_key)
+        query = query.order_by(Event.occurred_at, Event.event_id).offset(self.batch_size - 1).limit(1)
+        
+        row = (await db.execute(query)).first()
+        return tuple(row) if row else None
+    
+    async def _copy_out_window(self,
+                               db: AsyncSession,
+                               batch_start: Optional[Tuple[datetime, Any]],
+                               batch_end: Optional[Tuple[datetime, Any]],
+                               archive_threshold: datetime,
+                               max_age_threshold: datetime) -> Tuple[bytes, int]:
+        """
+        Delete the keyset window (batch_start, batch_end] and return its rows.
+        
+        Runs COPY (DELETE ... RETURNING ...) TO STDOUT on the session's
+        connection, so the rows come back as tab-separated text ready for
+        ClickHouse without building Python objects, and exactly the deleted
+        rows are archived (events ingested into the window meanwhile included).
+        The caller commits or rolls back. Returns (TSV block, row count).
+        """
+        conditions = ["occurred_at > $1", "occurred_at < $2"]
+        args: List[Any] = [max_age_threshold, archive_threshold]
+        if batch_start is not None:
+            conditions.append("(occurred_at, event_id) > ($3, $4)")
+            args.extend(batch_start)
+        if batch_end is not None:
+            conditions.append(f"(occurred_at, event_id) <= (${len(args) + 1}, ${len(args) + 2})")
+            args.extend(batch_end)
+        query = ARCHIVE_WINDOW_QUERY.format(conditions=" AND ".join(conditions))
+        
+        # The raw COPY below must join the session's transaction so the
+        # caller's commit/rollback decides whether the DELETE sticks
+        connection = await db.connection()
+        await _begin_driver_transaction(connection)
+        raw_connection = await connection.get_raw_connection()
+        output = io.BytesIO()
+        status = await raw_connection.driver_connection.copy_from_query(
+            query, *args, output=output, format='text'
+        )
+        return output.getvalue(), int(status.split()[-1])
+    
+    def invalidate_candidates_cache(self) -> None:
+        """Drop the shared get_archival_candidates() result."""
+        self._candidates_task = None
+    
+    def _candidates_reusable(self) -> bool:
+        """Whether the current candidates task may be shared with a new caller."""
+        task = self._candidates_task
+        if task is None:
             return False
+        if not task.done():
+            return True  # in flight: join it
+        if task.cancelled() or 'error' in task.result():
+            return False
+        return time.monotonic() - self._candidates_started_at < CANDIDATES_CACHE_TTL_SECONDS
     
     async def get_archival_candidates(self) -> Dict[str, Any]:
         """
         Get information about events that are candidates for archival.
         
+        Concurrent callers share one in-flight query, and a successful result
+        is reused for CANDIDATES_CACHE_TTL_SECONDS.
+        
         Returns:
             Dict with candidate statistics
         """
+        if not self._candidates_reusable():
+            self._candidates_task = asyncio.create_task(self._compute_archival_candidates())
+            self._candidates_started_at = time.monotonic()
+        
+        # shield: a cancelled request must not cancel the query other callers await
+        return await asyncio.shield(self._candidates_task)
+    
+    async def _compute_archival_candidates(self) -> Dict[str, Any]:
+        """Query candidate statistics from PostgreSQL."""
         try:
-            archive_threshold = datetime.now() - timedelta(days=self.hot_retention_days)
-            max_age_threshold = datetime.now() - timedelta(days=self.max_archive_age_days)
+            # Aware UTC: occurred_at is timestamptz, and asyncpg reads naive values as UTC
+            now = datetime.now(timezone.utc)
+            archive_threshold = now - timedelta(days=self.hot_retention_days)
+            max_age_threshold = now - timedelta(days=self.max_archive_age_days)
             
             async for db in get_db():
-                # Count events ready for archival
-                candidates_query = select(Event).where(
+                # Count events ready for archival per UTC date; one row per
+                # day comes back however many events are waiting. 'UTC' is
+                # inlined: as a bind parameter the GROUP BY expression would
+                # no longer match the selected one
+                day = func.date(func.timezone(literal_column("'UTC'"), Event.occurred_at)).label('day')
+                candidates_query = select(day, func.count()).where(
                     and_(
                         Event.occurred_at < archive_threshold,
                         Event.occurred_at > max_age_threshold
                     )
-                )
+                ).group_by(day).order_by(day)
                 
-                result = await db.execute(candidates_query)
-                candidates = result.scalars().all()
-                
-                # Group by date for analysis
-                date_counts = {}
-                for event in candidates:
-                    date_str = event.occurred_at.strftime('%Y-%m-%d')
-                    date_counts[date_str] = date_counts.get(date_str, 0) + 1
+                date_counts = {
+                    day.isoformat(): count
+                    for day, count in (await db.execute(candidates_query)).all()
+                }
+                total_candidates = sum(date_counts.values())
                 
                 return {
-                    'total_candidates': len(candidates),
+                    'total_candidates': total_candidates,
                     'archive_threshold': archive_threshold.isoformat(),
                     'max_age_threshold': max_age_threshold.isoformat(),
                     'candidates_by_date': date_counts,
-                    'estimated_batches': (len(candidates) + self.batch_size - 1) // self.batch_size
+                    'estimated_batches': (total_candidates + self.batch_size - 1) // self.batch_size
                 }
                 break
                 
@@ -190,13 +358,12 @@ class DataArchivalService:
             logger.error(f"Failed to get archival candidates: {e}")
             return {'error': str(e)}
     
-    async def verify_archival_integrity(self, sample_size: int = 100) -> Dict[str, Any]:
+    async def verify_archival_integrity(self) -> Dict[str, Any]:
         """
         Verify that archived data in ClickHouse matches what was in PostgreSQL.
         
-        Args:
-            sample_size: Number of recent archived events to verify
-            
+        Aggregates every event archived during the last day.
+        
         Returns:
             Dict with verification results
         """
@@ -212,26 +379,34 @@ class DataArchivalService:
                     'error': 'ClickHouse not accessible'
                 }
             
-            # Get sample of recent archived data
+            # Stats over everything archived in the last day. Archival only
+            # moves events younger than max_archive_age_days, so older
+            # partitions are pruned without reading them.
             async with clickhouse_service.get_client() as client:
                 query = """
                 SELECT 
-                    count() as total_events,
+                    count() as archived_last_day,
                     uniq(user_id) as unique_users,
                     min(occurred_at) as oldest_event,
                     max(occurred_at) as newest_event,
                     max(ingested_at) as last_ingested
                 FROM events_cold
+                WHERE partition_date >= today() - %(max_age_days)s
+                  AND ingested_at > now() - INTERVAL 1 DAY
                 """
                 
-                result = client.query(query)
+                result = await asyncio.to_thread(
+                    client.query,
+                    query,
+                    parameters={'max_age_days': self.max_archive_age_days}
+                )
                 row = result.result_rows[0] if result.result_rows else None
                 
-                if row:
+                if row and row[0]:
                     return {
                         'status': 'success',
                         'clickhouse_stats': {
-                            'total_events': row[0],
+                            'archived_last_day': row[0],
                             'unique_users': row[1],
                             'oldest_event': str(row[2]) if row[2] else None,
                             'newest_event': str(row[3]) if row[3] else None,
@@ -242,8 +417,8 @@ class DataArchivalService:
                     return {
                         'status': 'success',
                         'clickhouse_stats': {
-                            'total_events': 0,
-                            'message': 'No archived events found'
+                            'archived_last_day': 0,
+                            'message': 'No events archived in the last day'
                         }
                     }
                     
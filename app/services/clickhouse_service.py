@@ -5,28 +5,117 @@ Handles data archival from hot PostgreSQL storage to cold ClickHouse storage.
 
 import logging
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import operator
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from contextlib import asynccontextmanager
 
 import clickhouse_connect
+from clickhouse_connect import common as clickhouse_common
 from clickhouse_connect.driver.client import Client
+from clickhouse_connect.driver.exceptions import OperationalError
+from clickhouse_connect.driver.httputil import get_pool_manager
+from cachetools import TLRUCache
+import orjson
 
 from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# No server sessions: the shared client is then safe to use from several
+# threads at once (archival inserts run concurrently), and nothing here
+# relies on session state such as temporary tables
+clickhouse_common.set_setting('autogenerate_session_id', False)
+
+# Keep-alive HTTP connections shared by the client; sized for concurrent
+# archival inserts plus API queries
+CLICKHOUSE_POOL_SIZE = 16
+
+# Analytics range results are cached per parameters. Ranges reaching into the
+# hot retention window still receive data on archival; older ranges are
+# effectively immutable
+LIVE_RANGE_TTL_SECONDS = 60
+CLOSED_RANGE_TTL_SECONDS = 86400
+
+# Weekly retention of the users active in the cohort's first week. The cohort
+# size is a scalar computed once; the server-side query cache shares results
+# between workers (the in-process range cache is per worker)
+RETENTION_COHORT_QUERY = """
+    WITH
+        cohort_users AS (
+            SELECT DISTINCT user_id
+            FROM events_cold
+            WHERE toDate(occurred_at) >= toDate(%(start_date)s)
+              AND toDate(occurred_at) < toDate(%(start_date)s) + INTERVAL 7 DAY
+        ),
+        (SELECT count() FROM cohort_users) AS cohort_size
+    SELECT 
+        week_number,
+        uniq(user_id) as retained_users,
+        (retained_users * 100.0) / cohort_size as retention_rate
+    FROM (
+        SELECT 
+            user_id,
+            intDiv(toDayOfYear(occurred_at) - toDayOfYear(toDate(%(start_date)s)), 7) as week_number
+        FROM events_cold
+        WHERE user_id IN (SELECT user_id FROM cohort_users)
+          AND toDate(occurred_at) >= toDate(%(start_date)s)
+          AND toDate(occurred_at) < toDate(%(start_date)s) + INTERVAL %(windows)s WEEK
+        GROUP BY user_id, week_number
+    )
+    GROUP BY week_number
+    ORDER BY week_number
+"""
+RETENTION_QUERY_SETTINGS = {'use_query_cache': 1, 'query_cache_ttl': 600}
+
+# events_cold columns written by archival; ingested_at uses its DEFAULT now64()
+ARCHIVE_COLUMNS = ['event_id', 'user_id', 'event_type', 'occurred_at', 'properties']
+
+# Positions of events_cold's ORDER BY (event_type, user_id, occurred_at) in
+# ARCHIVE_COLUMNS. Rows sent already in key order spare ClickHouse sorting
+# each block on insert.
+archive_sort_key = operator.itemgetter(2, 1, 3)
+
+# Inserts smaller than this go through the server-side async insert buffer,
+# which coalesces them into block-sized parts instead of one tiny part each.
+# wait_for_async_insert keeps success meaning "flushed to events_cold", so
+# archival still only deletes from PostgreSQL what ClickHouse has stored.
+SYNC_INSERT_MIN_ROWS = 50_000
+ASYNC_INSERT_SETTINGS = {
+    'async_insert': 1,
+    'wait_for_async_insert': 1,
+    'async_insert_max_data_size': 10_000_000,
+    'async_insert_busy_timeout_ms': 200,
+}
+
+
+def insert_settings(rows: int) -> Dict[str, Any]:
+    """Insert settings for a batch of `rows` rows."""
+    return {} if rows >= SYNC_INSERT_MIN_ROWS else dict(ASYNC_INSERT_SETTINGS)
+
 
 class ClickHouseService:
-    """Service for managing ClickHouse cold storage operations."""
+    """
+    Service for managing ClickHouse cold storage operations.
+    
+    clickhouse-connect is synchronous, so every call that reaches the server
+    runs in a worker thread (asyncio.to_thread) to keep the event loop free.
+    """
     
-    def __init__(self):
+    def __init__(self, hot_retention_days: int = 7):
         self.client: Optional[Client] = None
+        # Days of events still in PostgreSQL, i.e. not yet archived here
+        self.hot_retention_days = hot_retention_days
+        # Values are (last date covered, result)
+        self._range_cache: TLRUCache = TLRUCache(maxsize=1024, ttu=self._range_ttu)
         self._connection_params = {
             'host': settings.CLICKHOUSE_HOST,
             'port': settings.CLICKHOUSE_PORT,
             'database': settings.CLICKHOUSE_DB,
             'username': settings.CLICKHOUSE_USER,
+            # LZ4 on the wire both ways; properties JSON compresses well
+            'compress': 'lz4',
+            'pool_mgr': get_pool_manager(maxsize=CLICKHOUSE_POOL_SIZE),
         }
         
         # Add password only if provided
@@ -35,20 +124,54 @@ class ClickHouseService:
     
     @asynccontextmanager
     async def get_client(self):
-        """Get ClickHouse client with connection management."""
+        """Get the shared ClickHouse client, created on first use."""
         try:
             if not self.client:
-                self.client = clickhouse_connect.get_client(**self._connection_params)
+                # Creating the client queries the server (version, settings)
+                self.client = await asyncio.to_thread(
+                    clickhouse_connect.get_client, **self._connection_params
+                )
             yield self.client
+        except OperationalError as e:
+            # Server unreachable: rebuild the client on the next call
+            logger.error(f"ClickHouse connection error: {e}")
+            self.client = None
+            raise
         except Exception as e:
             logger.error(f"ClickHouse connection error: {e}")
             raise
     
+    def _range_ttu(self, _key: Tuple, value: Tuple[date, Any], now: float) -> float:
+        """Compute expiry for a cached range result from the last date it covers."""
+        last_date, _ = value
+        closed_before = date.today() - timedelta(days=self.hot_retention_days)
+        if last_date < closed_before:
+            return now + CLOSED_RANGE_TTL_SECONDS
+        return now + LIVE_RANGE_TTL_SECONDS
+    
+    async def _cached_range(self,
+                            key: Tuple,
+                            last_date: date,
+                            compute: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Return the cached result for a range query, computing it on a miss."""
+        cached = self._range_cache.get(key)
+        if cached is not None:
+            return cached[1]
+        
+        result = await compute()
+        if result:  # failures come back empty and are not cached
+            self._range_cache[key] = (last_date, result)
+        return result
+    
+    def invalidate_range_cache(self) -> None:
+        """Drop cached range results, e.g. after archival added events."""
+        self._range_cache.clear()
+    
     async def ping(self) -> bool:
         """Check ClickHouse connectivity."""
         try:
             async with self.get_client() as client:
-                result = client.ping()
+                result = await asyncio.to_thread(client.ping)
                 return result
         except Exception as e:
             logger.error(f"ClickHouse ping failed: {e}")
@@ -70,45 +193,92 @@ class ClickHouseService:
             
         try:
             async with self.get_client() as client:
-                # Prepare data for ClickHouse insertion
-                formatted_data = []
+                # Prepare data for ClickHouse insertion, keyed by event_id so
+                # a repeated event is sent once (its last occurrence wins)
+                latest: Dict[str, tuple] = {}
                 for event in events_data:
-                    # Convert properties to JSON string if it's a dict
+                    # Properties already serialized (str/bytes) pass through
                     properties_json = event.get('properties', '{}')
-                    if isinstance(properties_json, dict):
-                        import json
-                        properties_json = json.dumps(properties_json)
+                    if isinstance(properties_json, bytes):
+                        properties_json = properties_json.decode()
+                    elif not isinstance(properties_json, str):
+                        properties_json = orjson.dumps(properties_json).decode()
                     
-                    formatted_data.append([
-                        str(event['event_id']),  # UUID as string
+                    event_id = str(event['event_id'])  # UUID as string
+                    latest[event_id] = (
+                        event_id,
                         event['user_id'],
                         event['event_type'],
                         event['occurred_at'],
                         properties_json,
-                        datetime.now()  # ingested_at
-                    ])
+                    )
+                formatted_data = sorted(latest.values(), key=archive_sort_key)
                 
-                # Insert data into ClickHouse
-                client.insert(
+                # Insert column-oriented: the driver serializes columns, so
+                # handing it columns skips its own row-to-column transpose.
+                # ingested_at is left to its DEFAULT now64().
+                await asyncio.to_thread(
+                    client.insert,
                     'events_cold',
-                    formatted_data,
-                    column_names=[
-                        'event_id', 'user_id', 'event_type', 
-                        'occurred_at', 'properties', 'ingested_at'
-                    ]
+                    list(zip(*formatted_data)),
+                    column_names=ARCHIVE_COLUMNS,
+                    column_oriented=True,
+                    settings=insert_settings(len(formatted_data))
                 )
                 
-                logger.info(f"Successfully archived {len(events_data)} events to ClickHouse")
+                logger.info(f"Successfully archived {len(formatted_data)} events to ClickHouse")
                 return True
                 
         except Exception as e:
             logger.error(f"Failed to archive events to ClickHouse: {e}")
             return False
     
+    async def archive_tsv(self, block: bytes, rows: int) -> bool:
+        """
+        Archive events given as a tab-separated block in ARCHIVE_COLUMNS order.
+        
+        PostgreSQL's text COPY format uses the same escaping as ClickHouse
+        TabSeparated, so the block is only reordered by the table key before
+        insertion. Fields are compared as escaped bytes, which matches
+        ClickHouse's String order except around escaped characters; that
+        only costs ClickHouse a little re-sorting, never correctness.
+        
+        Args:
+            block: TabSeparated rows
+            rows: Number of rows in the block
+            
+        Returns:
+            bool: Success status
+        """
+        try:
+            async with self.get_client() as client:
+                await asyncio.to_thread(self._insert_tsv, client, block, rows)
+                return True
+        except Exception as e:
+            logger.error(f"Failed to archive events to ClickHouse: {e}")
+            return False
+    
+    @staticmethod
+    def _insert_tsv(client: Client, block: bytes, rows: int) -> None:
+        """Sort a TabSeparated block by the table key and insert it."""
+        lines = block.rstrip(b'\n').split(b'\n')
+        lines.sort(key=lambda line: archive_sort_key(line.split(b'\t', 4)))
+        client.raw_insert(
+            'events_cold',
+            column_names=ARCHIVE_COLUMNS,
+            insert_block=b'\n'.join(lines) + b'\n',
+            fmt='TabSeparated',
+            # occurred_at arrives as ISO-8601 with a Z suffix
+            settings={'date_time_input_format': 'best_effort', **insert_settings(rows)}
+        )
+    
     async def get_dau_fast(self, from_date: str, to_date: str) -> List[Dict[str, Any]]:
         """
         Get Daily Active Users using ClickHouse materialized view (super fast).
         
+        Results are cached per date range, much longer once the range
+        is older than the hot retention window.
+        
         Args:
             from_date: Start date (YYYY-MM-DD)
             to_date: End date (YYYY-MM-DD)
@@ -116,6 +286,14 @@ class ClickHouseService:
         Returns:
             List of DAU data per day
         """
+        return await self._cached_range(
+            ('dau', from_date, to_date),
+            date.fromisoformat(to_date),
+            lambda: self._query_dau(from_date, to_date)
+        )
+    
+    async def _query_dau(self, from_date: str, to_date: str) -> List[Dict[str, Any]]:
+        """Query DAU per day from the materialized view."""
         try:
             async with self.get_client() as client:
                 query = """
@@ -129,7 +307,8 @@ class ClickHouseService:
                 ORDER BY event_date
                 """
                 
-                result = client.query(
+                result = await asyncio.to_thread(
+                    client.query,
                     query, 
                     parameters={'from_date': from_date, 'to_date': to_date}
                 )
@@ -158,6 +337,14 @@ class ClickHouseService:
         Returns:
             List of top event types with counts
         """
+        return await self._cached_range(
+            ('top_events', from_date, to_date, limit),
+            date.fromisoformat(to_date),
+            lambda: self._query_top_events(from_date, to_date, limit)
+        )
+    
+    async def _query_top_events(self, from_date: str, to_date: str, limit: int) -> List[Dict[str, Any]]:
+        """Query top event types from the materialized view."""
         try:
             async with self.get_client() as client:
                 query = """
@@ -172,7 +359,8 @@ class ClickHouseService:
                 LIMIT %(limit)s
                 """
                 
-                result = client.query(
+                result = await asyncio.to_thread(
+                    client.query,
                     query, 
                     parameters={
                         'from_date': from_date, 
@@ -204,39 +392,24 @@ class ClickHouseService:
         Returns:
             List of cohort retention data
         """
+        return await self._cached_range(
+            ('retention', start_date, windows),
+            date.fromisoformat(start_date) + timedelta(weeks=windows),
+            lambda: self._query_retention_cohort(start_date, windows)
+        )
+    
+    async def _query_retention_cohort(self, start_date: str, windows: int) -> List[Dict[str, Any]]:
+        """Query weekly retention from events_cold."""
         try:
             async with self.get_client() as client:
-                query = """
-                WITH cohort_users AS (
-                    SELECT DISTINCT user_id
-                    FROM events_cold
-                    WHERE toDate(occurred_at) >= toDate(%(start_date)s)
-                      AND toDate(occurred_at) < toDate(%(start_date)s) + INTERVAL 7 DAY
-                )
-                SELECT 
-                    week_number,
-                    uniq(user_id) as retained_users,
-                    (uniq(user_id) * 100.0) / (SELECT count() FROM cohort_users) as retention_rate
-                FROM (
-                    SELECT 
-                        user_id,
-                        intDiv(toDayOfYear(occurred_at) - toDayOfYear(toDate(%(start_date)s)), 7) as week_number
-                    FROM events_cold
-                    WHERE user_id IN (SELECT user_id FROM cohort_users)
-                      AND toDate(occurred_at) >= toDate(%(start_date)s)
-                      AND toDate(occurred_at) < toDate(%(start_date)s) + INTERVAL %(windows)s WEEK
-                    GROUP BY user_id, week_number
-                )
-                GROUP BY week_number
-                ORDER BY week_number
-                """
-                
-                result = client.query(
-                    query,
+                result = await asyncio.to_thread(
+                    client.query,
+                    RETENTION_COHORT_QUERY,
                     parameters={
                         'start_date': start_date,
                         'windows': windows
-                    }
+                    },
+                    settings=RETENTION_QUERY_SETTINGS
                 )
                 
                 return [
@@ -269,7 +442,8 @@ class ClickHouseService:
                 ORDER BY sum(bytes_on_disk) DESC
                 """
                 
-                size_result = client.query(
+                size_result = await asyncio.to_thread(
+                    client.query,
                     size_query,
                     parameters={'database': settings.CLICKHOUSE_DB}
                 )
@@ -289,7 +463,8 @@ class ClickHouseService:
                 LIMIT 20
                 """
                 
-                partition_result = client.query(
+                partition_result = await asyncio.to_thread(
+                    client.query,
                     partition_query,
                     parameters={'database': settings.CLICKHOUSE_DB}
                 )
@@ -3,20 +3,48 @@ Event service for handling event ingestion and retrieval.
 """
 
 import json
-from datetime import datetime, timezone
-from typing import List, Tuple, Union, Optional
+from datetime import datetime
+from typing import Any, Dict, List, Tuple, Union, Optional
 from uuid import UUID
 
-from sqlalchemy import and_, func, select
+import orjson
+from sqlalchemy import and_, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..core.config import settings
 from ..core.logging import get_logger
 from ..models.database import Event
 from ..models.schemas import EventInput, EventResponse
 
 logger = get_logger(__name__)
 
+# Per-connection staging table for COPY imports; rows vanish on commit
+CREATE_STAGING_TABLE = text("""
+    CREATE TEMP TABLE IF NOT EXISTS events_staging
+    (LIKE events INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+""")
+
+STAGING_COLUMNS = ['event_id', 'occurred_at', 'user_id', 'event_type', 'properties']
+
+MERGE_STAGING_INTO_EVENTS = text("""
+    INSERT INTO events (event_id, occurred_at, user_id, event_type, properties, created_at)
+    SELECT event_id, occurred_at, user_id, event_type, properties, created_at
+    FROM events_staging
+    ON CONFLICT (event_id) DO NOTHING
+    RETURNING event_id
+""")
+
+# Executemany form: compiled once and cached regardless of batch size;
+# SQLAlchemy's insertmanyvalues sends it as batched multi-row VALUES
+INSERT_EVENTS_IGNORE_DUPLICATES = (
+    pg_insert(Event)
+    .on_conflict_do_nothing(index_elements=['event_id'])
+    .returning(Event.event_id)
+)
+
+
 
 class EventService:
     """Service for handling event operations."""
@@ -24,77 +52,62 @@ class EventService:
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def create_events(self, events: List[EventInput]) -> Tuple[List[EventResponse], int, int]:
+    async def create_events(
+        self,
+        events: List[EventInput],
+        bulk: bool = True
+    ) -> Tuple[List[EventResponse], int, int]:
         """
         Create multiple events with idempotency support.
         
+        Args:
+            events: Events to create
+            bulk: Insert the batch in one statement via insert_rows (default);
+                False falls back to inserting event by event
+        
         Returns:
             Tuple of (responses, created_count, duplicate_count)
         """
+        if bulk:
+            return await self.insert_rows([event.model_dump() for event in events])
+        
+        return await self._create_events_per_row(events)
+    
+    async def _create_events_per_row(self, events: List[EventInput]) -> Tuple[List[EventResponse], int, int]:
+        """Create events one by one, each under a savepoint so a duplicate only rolls back itself."""
         responses = []
         created_count = 0
         duplicate_count = 0
         
         for event_data in events:
+            # occurred_at keeps its offset for the timestamptz column and
+            # created_at comes from the server
+            db_event = Event(
+                event_id=event_data.event_id,
+                occurred_at=event_data.occurred_at,
+                user_id=event_data.user_id,
+                event_type=event_data.event_type,
+                properties=event_data.properties  # Use dict directly for JSONB
+            )
+            
             try:
-                # Check if event already exists
-                result = await self.db.execute(
-                    select(Event).filter(Event.event_id == event_data.event_id)
-                )
-                existing_event = result.scalar_one_or_none()
-                
-                if existing_event:
-                    responses.append(EventResponse(
-                        event_id=event_data.event_id,
-                        status="duplicate"
-                    ))
-                    duplicate_count += 1
-                    logger.info(
-                        "Event already exists",
-                        event_id=str(event_data.event_id),
-                        user_id=event_data.user_id
-                    )
-                else:
-                    # Create new event
-                    # Convert timezone-aware to timezone-naive for PostgreSQL
-                    occurred_at_naive = event_data.occurred_at.replace(tzinfo=None) if event_data.occurred_at.tzinfo else event_data.occurred_at
-                    
-                    db_event = Event(
-                        event_id=event_data.event_id,
-                        occurred_at=occurred_at_naive,
-                        user_id=event_data.user_id,
-                        event_type=event_data.event_type,
-                        properties=event_data.properties,  # Use dict directly for JSONB
-                        created_at=datetime.now()
-                    )
-                    
+                # The primary key catches existing events; no lookup first
+                async with self.db.begin_nested():
                     self.db.add(db_event)
+                    await self.db.flush()
+                
+                responses.append(EventResponse(
+                    event_id=event_data.event_id,
+                    status="created"
+                ))
+                created_count += 1
                     
-                    responses.append(EventResponse(
-                        event_id=event_data.event_id,
-                        status="created"
-                    ))
-                    created_count += 1
-                    logger.info(
-                        "Event created",
-                        event_id=str(event_data.event_id),
-                        user_id=event_data.user_id,
-                        event_type=event_data.event_type
-                    )
-                    
-            except IntegrityError as e:
-                # Handle race conditions - event might have been created concurrently
-                await self.db.rollback()
+            except IntegrityError:
                 responses.append(EventResponse(
                     event_id=event_data.event_id,
                     status="duplicate"
                 ))
                 duplicate_count += 1
-                logger.warning(
-                    "Event creation failed due to duplicate",
-                    event_id=str(event_data.event_id),
-                    error=str(e)
-                )
             except Exception as e:
                 await self.db.rollback()
                 logger.error(
@@ -111,8 +124,108 @@ class EventService:
             logger.error("Failed to commit events", error=str(e))
             raise
         
+        # One record per batch rather than per event
+        logger.info(
+            "Events batch ingested",
+            created=created_count,
+            duplicates=duplicate_count,
+            total=len(events)
+        )
         return responses, created_count, duplicate_count
     
+    async def insert_rows(self, rows: List[Dict[str, Any]]) -> Tuple[List[EventResponse], int, int]:
+        """Insert event rows idempotently, with COPY for large batches."""
+        if len(rows) >= settings.DB_COPY_MIN_ROWS:
+            return await self.copy_insert(rows)
+        return await self.bulk_insert(rows)
+    
+    async def bulk_insert(self, rows: List[Dict[str, Any]]) -> Tuple[List[EventResponse], int, int]:
+        """
+        Insert a batch of event rows with a single INSERT ... ON CONFLICT DO NOTHING.
+        
+        Args:
+            rows: Event dicts with event_id, occurred_at, user_id, event_type, properties
+        
+        Returns:
+            Tuple of (responses, created_count, duplicate_count)
+        """
+        if not rows:
+            return [], 0, 0
+        
+        try:
+            result = await self.db.execute(INSERT_EVENTS_IGNORE_DUPLICATES, rows)
+            inserted_ids = set(result.scalars().all())
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Failed to bulk insert events", events_count=len(rows), error=str(e))
+            raise
+        
+        return self._build_responses(rows, inserted_ids)
+    
+    async def copy_insert(self, rows: List[Dict[str, Any]]) -> Tuple[List[EventResponse], int, int]:
+        """
+        Load a batch of event rows with COPY into a staging table, then merge it.
+        
+        Faster than bulk_insert for large batches; PostgreSQL/asyncpg only.
+        
+        Args:
+            rows: Event dicts with event_id, occurred_at, user_id, event_type, properties
+        
+        Returns:
+            Tuple of (responses, created_count, duplicate_count)
+        """
+        if not rows:
+            return [], 0, 0
+        
+        records = [
+            (
+                row['event_id'],
+                row['occurred_at'],
+                row['user_id'],
+                row['event_type'],
+                orjson.dumps(row['properties']).decode()
+            )
+            for row in rows
+        ]
+        
+        try:
+            # Runs through SQLAlchemy first so the COPY below joins its transaction
+            await self.db.execute(CREATE_STAGING_TABLE)
+            
+            connection = await self.db.connection()
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                'events_staging', records=records, columns=STAGING_COLUMNS
+            )
+            
+            result = await self.db.execute(MERGE_STAGING_INTO_EVENTS)
+            inserted_ids = set(result.scalars().all())
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error("Failed to copy events", events_count=len(rows), error=str(e))
+            raise
+        
+        return self._build_responses(rows, inserted_ids)
+    
+    @staticmethod
+    def _build_responses(rows: List[Dict[str, Any]], inserted_ids: set) -> Tuple[List[EventResponse], int, int]:
+        """Classify rows as created or duplicate from the ids the INSERT returned."""
+        responses = []
+        created_count = 0
+        for row in rows:
+            event_id = row['event_id']
+            if event_id in inserted_ids:
+                # Only the first occurrence of an id within the batch counts as created
+                inserted_ids.discard(event_id)
+                responses.append(EventResponse(event_id=event_id, status="created"))
+                created_count += 1
+            else:
+                responses.append(EventResponse(event_id=event_id, status="duplicate"))
+        
+        return responses, created_count, len(rows) - created_count
+    
     async def get_events(
         self, 
         user_id: Optional[int] = None,
@@ -120,10 +233,10 @@ class EventService:
         from_date: Optional[datetime] = None,
         to_date: Optional[datetime] = None,
         limit: int = 100,
-        offset: int = 0
+        before: Optional[Tuple[datetime, UUID]] = None
     ) -> List[Event]:
         """
-        Get events with optional filtering and pagination.
+        Get events with optional filtering and keyset pagination.
         
         Args:
             user_id: Filter by user ID
@@ -131,7 +244,7 @@ class EventService:
             from_date: Filter events from this date (inclusive)
             to_date: Filter events to this date (inclusive)
             limit: Maximum number of events to return
-            offset: Number of events to skip
+            before: (occurred_at, event_id) of the last event of the previous page
         
         Returns:
             List of Event objects
@@ -152,14 +265,16 @@ class EventService:
         if to_date is not None:
             filters.append(Event.occurred_at <= to_date)
         
+        if before is not None:
+            filters.append(tuple_(Event.occurred_at, Event.event_id) < before)
+        
         if filters:
             query = query.filter(and_(*filters))
         
         # Apply ordering, pagination
         query = (
             query
-            .order_by(Event.occurred_at.desc())
-            .offset(offset)
+            .order_by(Event.occurred_at.desc(), Event.event_id.desc())
             .limit(limit)
         )
         
@@ -0,0 +1,122 @@
+"""
+Response cache for the statistics endpoints.
+
+Entries are kept past their freshness TTL so a stale copy can be served
+when recomputing fails (e.g. the database is down).
+"""
+
+import time
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import orjson
+from cachetools import TLRUCache
+
+from ..core.config import settings
+from ..core.logging import get_logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional, only needed for STATS_CACHE_BACKEND=redis
+    aioredis = None
+
+logger = get_logger(__name__)
+
+BASIC_STATS_TTL = 10
+OPEN_WINDOW_TTL = 60
+# Windows that ended before today no longer change (until archival moves
+# their events out); keep them for a day rather than forever
+CLOSED_WINDOW_TTL = 24 * 3600
+# How long an expired entry is kept around as a fallback
+STALE_GRACE_SECONDS = 3600
+
+
+def window_ttl(to_date: date) -> int:
+    """TTL for a date-window query: long once the window is in the past."""
+    return CLOSED_WINDOW_TTL if to_date < date.today() else OPEN_WINDOW_TTL
+
+
+def cache_key(endpoint: str, params: Dict[str, Any]) -> str:
+    """Key from the endpoint name and its query params, sorted."""
+    query = "&".join(f"{name}={params[name]}" for name in sorted(params) if params[name] is not None)
+    return f"stats:{endpoint}?{query}"
+
+
+class InMemoryStatsCacheBackend:
+    """Per-process store; each worker warms its own copy."""
+
+    def __init__(self, maxsize: int = 1024):
+        # Values are (expires_at, payload); expires_at is on the monotonic clock
+        self._entries = TLRUCache(maxsize, ttu=lambda _key, value, _now: value[0], timer=time.monotonic)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    async def set(self, key: str, payload: bytes, expire_seconds: int) -> None:
+        self._entries[key] = (time.monotonic() + expire_seconds, payload)
+
+
+class RedisStatsCacheBackend:
+    """Store shared by all workers."""
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("STATS_CACHE_BACKEND=redis requires the 'redis' package")
+        self.client = aioredis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, payload: bytes, expire_seconds: int) -> None:
+        await self.client.set(key, payload, ex=expire_seconds)
+
+
+class StatsCache:
+    """TTL cache of JSON-serializable endpoint results with stale fallback."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def get_or_compute(self, key: str, ttl: int, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached result for `key`, recomputing it once older than `ttl`."""
+        try:
+            cached = await self.backend.get(key)
+        except Exception:
+            logger.exception("Stats cache read failed", key=key)
+            cached = None
+
+        stale = None
+        if cached is not None:
+            entry = orjson.loads(cached)
+            if entry["fresh_until"] > time.time():
+                return entry["data"]
+            stale = entry["data"]
+
+        try:
+            data = await compute()
+        except Exception:
+            if stale is None:
+                raise
+            logger.exception("Serving stale statistics", key=key)
+            return stale
+
+        payload = orjson.dumps({"fresh_until": time.time() + ttl, "data": data})
+        try:
+            await self.backend.set(key, payload, ttl + STALE_GRACE_SECONDS)
+        except Exception:
+            logger.exception("Stats cache write failed", key=key)
+        return data
+
+
+def create_stats_cache() -> StatsCache:
+    """Build the cache selected by settings.STATS_CACHE_BACKEND."""
+    if settings.STATS_CACHE_BACKEND == "redis":
+        return StatsCache(RedisStatsCacheBackend(settings.REDIS_URL))
+    if settings.STATS_CACHE_BACKEND == "memory":
+        return StatsCache(InMemoryStatsCacheBackend())
+    raise ValueError(f"Unknown STATS_CACHE_BACKEND: {settings.STATS_CACHE_BACKEND!r}")
+
+
+# Global cache instance
+stats_cache = create_stats_cache()
@@ -1,12 +1,34 @@
 
 
+import asyncio
+import base64
+import hashlib
 import pytest
+import orjson
 from uuid import uuid4
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
+from fastapi import HTTPException
 from sqlalchemy import text
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
 
 from app.models.database import Event, User, RefreshToken
-from app.core.auth import get_password_hash, verify_password
+from app.core.auth import (
+    _GET_ACTIVE_REFRESH_TOKEN, _token_hash_candidates, get_password_hash, hash_token, verify_password
+)
+from app.core.config import settings
+from app.api.v1.events import _decode_cursor, _encode_cursor, get_events
+from app.database.connection import AsyncSessionLocal, async_engine
+from app.services.archival_service import DataArchivalService
+from app.services.clickhouse_service import clickhouse_service
+from app.cli.import_events import iter_csv_range_rows, split_byte_ranges
+from app.middleware.rate_limit import InMemoryRateLimitBackend, RateLimitMiddleware, TokenBucket
+from app.services.event_service import EventService
+from app.services.stats_cache import (
+    CLOSED_WINDOW_TTL, OPEN_WINDOW_TTL, InMemoryStatsCacheBackend, StatsCache, window_ttl
+)
 
 
 class TestIdempotency:
@@ -301,5 +323,364 @@ class TestColdStorageIntegration:
         # Перевіряємо логіку
         assert recent_event > archive_threshold    
         assert old_event < archive_threshold and old_event > max_age_threshold 
-        assert too_old_event < max_age_threshold   
-        
+        assert too_old_event < max_age_threshold
+
+
+class TestArchivalRollback:
+    """Інтеграційний тест архівування при відмові ClickHouse."""
+
+    def test_failed_archive_keeps_events(self, db_session, monkeypatch):
+        """Тест: якщо ClickHouse відхилив пакет, DELETE відкочується і події лишаються в PostgreSQL."""
+        now = datetime.now(timezone.utc)
+        event_ids = [uuid4() for _ in range(3)]
+        for event_id in event_ids:
+            db_session.add(Event(
+                event_id=event_id, user_id="archived-user", event_type="login",
+                occurred_at=now - timedelta(days=10), properties={"n": 1}
+            ))
+        db_session.commit()
+
+        archived_blocks = []
+
+        async def reject_block(block, rows):
+            archived_blocks.append(rows)
+            return False
+
+        monkeypatch.setattr(clickhouse_service, "archive_tsv", reject_block)
+
+        service = DataArchivalService(hot_retention_days=7, max_archive_age_days=30)
+        stats = {'events_processed': 0, 'events_archived': 0, 'events_deleted': 0,
+                 'batches_processed': 0, 'errors': []}
+
+        async def scenario():
+            try:
+                async with AsyncSessionLocal() as db:
+                    await service._archive_window(
+                        db, None, None, now - timedelta(days=7), now - timedelta(days=30), stats
+                    )
+            finally:
+                # The pool belongs to this asyncio.run loop only
+                await async_engine.dispose()
+
+        asyncio.run(scenario())
+
+        assert archived_blocks == [3]  # DELETE ... RETURNING віддав усі 3 рядки
+        assert stats['events_deleted'] == 0
+        assert len(stats['errors']) == 1
+
+        db_session.expire_all()
+        remaining = db_session.execute(text(
+            "SELECT COUNT(*) FROM events WHERE user_id = 'archived-user'"
+        )).scalar()
+        assert remaining == 3
+
+
+class TestEventsCursor:
+    """Unit тести курсорної пагінації GET /events."""
+
+    class _StubEventService:
+        """Замість EventService: віддає задані події та запамʼятовує виклики."""
+
+        def __init__(self, events):
+            self.events = events
+            self.calls = []
+
+        async def get_events(self, **kwargs):
+            self.calls.append(kwargs)
+            return self.events[:kwargs['limit']]
+
+    @staticmethod
+    def _make_events(count):
+        base_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        return [
+            Event(
+                event_id=uuid4(), user_id=f"user{i}", event_type="login",
+                occurred_at=base_date - timedelta(minutes=i), properties={}
+            )
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def _get_page(event_service, limit, after=None):
+        response = asyncio.run(get_events(
+            user_id=None, event_type=None, from_date=None, to_date=None,
+            limit=limit, after=after, event_service=event_service
+        ))
+        return orjson.loads(response.body)
+
+    def test_cursor_round_trip(self):
+        """Тест: курсор декодується в той самий (occurred_at, event_id)."""
+        occurred_at = datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        event_id = uuid4()
+
+        cursor = _encode_cursor(occurred_at, event_id)
+
+        assert _decode_cursor(cursor) == (occurred_at, event_id)
+
+    def test_next_cursor_only_for_full_page(self):
+        """Тест: next_cursor повертається лише коли сторінка заповнена (len == limit)."""
+        events = self._make_events(3)
+        event_service = self._StubEventService(events)
+
+        full_page = self._get_page(event_service, limit=3)
+        assert full_page["count"] == 3
+        assert full_page["next_cursor"] == _encode_cursor(events[-1].occurred_at, events[-1].event_id)
+
+        short_page = self._get_page(event_service, limit=5)
+        assert short_page["count"] == 3
+        assert short_page["next_cursor"] is None
+
+        # Курсор попередньої сторінки передається в сервіс як keyset-позиція
+        self._get_page(event_service, limit=3, after=full_page["next_cursor"])
+        assert event_service.calls[-1]["before"] == (events[-1].occurred_at, events[-1].event_id)
+
+    def test_malformed_cursor_returns_400(self):
+        """Тест: пошкоджений курсор дає 400, а не 500."""
+        malformed_cursors = [
+            "not base64!",
+            base64.urlsafe_b64encode(b"no-separator").decode(),
+            base64.urlsafe_b64encode(b"not-a-date|" + str(uuid4()).encode()).decode(),
+            base64.urlsafe_b64encode(b"2024-01-01T00:00:00+00:00|not-a-uuid").decode(),
+            base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+        ]
+
+        for cursor in malformed_cursors:
+            with pytest.raises(HTTPException) as exc_info:
+                self._get_page(self._StubEventService([]), limit=10, after=cursor)
+            assert exc_info.value.status_code == 400
+
+
+class TestIngestPaths:
+    """Unit тести шляхів пакетного інгесту подій."""
+
+    def test_copy_threshold(self, monkeypatch):
+        """Тест: пакети від DB_COPY_MIN_ROWS рядків ідуть через COPY, менші - через INSERT."""
+        event_service = EventService(db=None)
+        used_paths = []
+
+        async def copy_insert(rows):
+            used_paths.append(("copy", len(rows)))
+            return [], 0, 0
+
+        async def bulk_insert(rows):
+            used_paths.append(("bulk", len(rows)))
+            return [], 0, 0
+
+        monkeypatch.setattr(event_service, "copy_insert", copy_insert)
+        monkeypatch.setattr(event_service, "bulk_insert", bulk_insert)
+
+        threshold = settings.DB_COPY_MIN_ROWS
+        asyncio.run(event_service.insert_rows([{}] * (threshold - 1)))
+        asyncio.run(event_service.insert_rows([{}] * threshold))
+
+        assert used_paths == [("bulk", threshold - 1), ("copy", threshold)]
+
+    def test_duplicates_within_batch(self):
+        """Тест: з повторів event_id в одному пакеті створеним вважається лише перший."""
+        new_id, repeated_id, existing_id = uuid4(), uuid4(), uuid4()
+        rows = [
+            {"event_id": repeated_id},
+            {"event_id": new_id},
+            {"event_id": repeated_id},
+            {"event_id": existing_id},
+        ]
+
+        responses, created, duplicates = EventService._build_responses(rows, {new_id, repeated_id})
+
+        assert [response.status for response in responses] == ["created", "created", "duplicate", "duplicate"]
+        assert [response.event_id for response in responses] == [row["event_id"] for row in rows]
+        assert created == 2
+        assert duplicates == 2
+
+
+class TestRateLimiting:
+    """Unit тести rate limiting."""
+
+    def test_lru_eviction(self):
+        """Тест: при переповненні витісняється клієнт, якого давно не було."""
+        backend = InMemoryRateLimitBackend(max_clients=2)
+
+        async def scenario():
+            for client_id in ("a", "b", "a", "c"):
+                await backend.consume(client_id, capacity=10, refill_rate=1.0, now=0.0)
+
+        asyncio.run(scenario())
+
+        assert list(backend.buckets) == ["a", "c"]
+
+    def test_token_refill(self):
+        """Тест: токени поповнюються з часом, але не понад місткість."""
+        bucket = TokenBucket(capacity=2, refill_rate=1.0, now=0.0)
+
+        assert bucket.consume(now=0.0) is True
+        assert bucket.consume(now=0.0) is True
+        assert bucket.consume(now=0.0) is False
+        assert bucket.consume(now=0.5) is False  # лише пів токена
+        assert bucket.consume(now=1.0) is True
+
+        assert bucket.consume(now=100.0) is True
+        assert bucket.tokens == 1  # поповнення обмежене capacity
+
+    def test_rate_limit_headers(self):
+        """Тест: відповіді несуть X-RateLimit-* заголовки, перевищення дає 429."""
+        async def ping(request):
+            return PlainTextResponse("pong")
+
+        app = RateLimitMiddleware(
+            Starlette(routes=[Route("/ping", ping)]),
+            rate_limit_per_minute=2,
+            backend=InMemoryRateLimitBackend()
+        )
+
+        with TestClient(app) as client:
+            first = client.get("/ping")
+            second = client.get("/ping")
+            limited = client.get("/ping")
+
+        assert first.status_code == 200
+        assert first.headers["x-ratelimit-limit"] == "2"
+        assert first.headers["x-ratelimit-remaining"] == "1"
+        assert int(first.headers["x-ratelimit-reset"]) > datetime.now(timezone.utc).timestamp()
+        assert second.headers["x-ratelimit-remaining"] == "0"
+
+        assert limited.status_code == 429
+        assert limited.headers["retry-after"] == "60"
+        assert limited.json() == {"detail": "Rate limit exceeded. Please try again later."}
+
+
+class TestStatsCache:
+    """Unit тести кешу статистики."""
+
+    def test_window_ttl(self):
+        """Тест: вікна, що закінчились до сьогодні, кешуються довше."""
+        today = date.today()
+
+        assert window_ttl(today - timedelta(days=1)) == CLOSED_WINDOW_TTL
+        assert window_ttl(today) == OPEN_WINDOW_TTL
+        assert window_ttl(today + timedelta(days=1)) == OPEN_WINDOW_TTL
+
+    def test_fresh_and_stale_entries(self):
+        """Тест: свіжий запис не перераховується, застарілий віддається при помилці."""
+        cache = StatsCache(InMemoryStatsCacheBackend())
+        computed = []
+
+        async def compute():
+            computed.append(True)
+            return {"total": len(computed)}
+
+        async def fail():
+            raise RuntimeError("database is down")
+
+        async def scenario():
+            # Свіжий запис повертається без повторного обчислення
+            assert await cache.get_or_compute("fresh", 60, compute) == {"total": 1}
+            assert await cache.get_or_compute("fresh", 60, fail) == {"total": 1}
+
+            # ttl=0: запис одразу застарілий, але лишається запасним
+            assert await cache.get_or_compute("stale", 0, compute) == {"total": 2}
+            assert await cache.get_or_compute("stale", 0, fail) == {"total": 2}
+            assert await cache.get_or_compute("stale", 0, compute) == {"total": 3}
+
+            # Без запасного запису помилка пробрасується
+            with pytest.raises(RuntimeError):
+                await cache.get_or_compute("missing", 60, fail)
+
+        asyncio.run(scenario())
+
+
+class TestCsvByteRanges:
+    """Unit тести розбиття CSV на байтові діапазони для паралельного імпорту."""
+
+    HEADER = "event_id,occurred_at,user_id,event_type,properties_json\n"
+
+    def _write_csv(self, path, lines):
+        rows = "".join(f"{uuid4()},2024-01-01T00:00:00Z,user{i},login,{{}}\n" for i in range(lines))
+        path.write_text(self.HEADER + rows)
+        return path
+
+    @staticmethod
+    def _read_all(csv_path, fieldnames, ranges):
+        return [
+            row["user_id"]
+            for start, end in ranges
+            for row in iter_csv_range_rows(csv_path, start, end, fieldnames)
+        ]
+
+    def test_ranges_cover_data_on_line_boundaries(self, tmp_path):
+        """Тест: діапазони суміжні, покривають усі дані й починаються з нового рядка."""
+        csv_path = self._write_csv(tmp_path / "events.csv", 100)
+        content = csv_path.read_bytes()
+
+        fieldnames, ranges = split_byte_ranges(csv_path, 4)
+
+        assert fieldnames == self.HEADER.strip().split(",")
+        assert len(ranges) == 4
+        assert ranges[0][0] == len(self.HEADER)
+        assert ranges[-1][1] == len(content)
+        for (_, end), (next_start, _) in zip(ranges, ranges[1:]):
+            assert end == next_start
+            assert content[next_start - 1:next_start] == b"\n"
+
+        assert self._read_all(csv_path, fieldnames, ranges) == [f"user{i}" for i in range(100)]
+
+    def test_tiny_files(self, tmp_path):
+        """Тест: файл лише із заголовком або з одним рядком."""
+        header_only = self._write_csv(tmp_path / "empty.csv", 0)
+        fieldnames, ranges = split_byte_ranges(header_only, 4)
+        assert ranges == [(len(self.HEADER), len(self.HEADER))]
+        assert self._read_all(header_only, fieldnames, ranges) == []
+
+        one_line = self._write_csv(tmp_path / "one.csv", 1)
+        fieldnames, ranges = split_byte_ranges(one_line, 4)
+        assert len(ranges) == 1
+        assert self._read_all(one_line, fieldnames, ranges) == ["user0"]
+
+    def test_more_parts_than_lines(self, tmp_path):
+        """Тест: частин більше, ніж рядків - кожен рядок читається рівно один раз."""
+        csv_path = self._write_csv(tmp_path / "events.csv", 3)
+
+        fieldnames, ranges = split_byte_ranges(csv_path, 10)
+
+        assert 1 <= len(ranges) <= 3
+        assert all(start < end for start, end in ranges)
+        assert self._read_all(csv_path, fieldnames, ranges) == ["user0", "user1", "user2"]
+
+
+class TestLegacyRefreshTokens:
+    """Тести пошуку refresh токенів, збережених зі старим SHA-256 хешем."""
+
+    def test_hash_candidates(self):
+        """Тест: кандидати - поточний BLAKE2b хеш і legacy SHA-256."""
+        token = "legacy-refresh-token"
+
+        current, legacy = _token_hash_candidates(token)
+
+        assert current == hash_token(token)
+        assert legacy == hashlib.sha256(token.encode()).hexdigest()
+        assert current != legacy
+
+    def test_legacy_token_lookup(self, db_session):
+        """Тест: активний токен зі SHA-256 хешем знаходиться, відкликаний - ні."""
+        now = datetime.now(timezone.utc)
+        for token_id, token, is_revoked in (("legacy-1", "active-token", False), ("legacy-2", "revoked-token", True)):
+            db_session.add(RefreshToken(
+                id=token_id,
+                user_id="legacy-user",
+                token_hash=hashlib.sha256(token.encode()).hexdigest(),
+                expires_at=now + timedelta(days=7),
+                is_revoked=is_revoked
+            ))
+        db_session.commit()
+
+        def lookup(token):
+            return db_session.execute(
+                _GET_ACTIVE_REFRESH_TOKEN,
+                {"token_hashes": list(_token_hash_candidates(token)), "now": datetime.now(timezone.utc)}
+            ).scalar_one_or_none()
+
+        found = lookup("active-token")
+        assert found is not None
+        assert found.id == "legacy-1"
+
+        assert lookup("revoked-token") is None
+        assert lookup("unknown-token") is None